@@ -0,0 +1,191 @@
+"""Initial schema
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-16
+"""
+from alembic import op
+
+
+revision = '0001'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+# Keys are 64-bit identities and timestamps carry their time zone.
+# Every statement is idempotent. On databases created by the old start-up
+# DDL the CREATE TABLEs are no-ops, so the block at the end converts their
+# SERIAL keys and naive timestamps in place.
+SCHEMA_SQL = """
+    -- Users table
+    CREATE TABLE IF NOT EXISTS users (
+        id BIGINT GENERATED ALWAYS AS IDENTITY PRIMARY KEY,
+        user_id BIGINT UNIQUE NOT NULL,
+        last_interaction TIMESTAMPTZ DEFAULT now()
+    );
+    -- UNIQUE(user_id) already indexes user lookups
+    DROP INDEX IF EXISTS idx_users_user_id;
+
+    -- User jobs table with performance optimization
+    CREATE TABLE IF NOT EXISTS user_jobs (
+        id BIGINT GENERATED ALWAYS AS IDENTITY PRIMARY KEY,
+        user_id BIGINT NOT NULL,
+        job_name TEXT NOT NULL,
+        status TEXT DEFAULT 'pending_form',
+        service_type TEXT NOT NULL,
+        latest_submission_id BIGINT,
+        created_at TIMESTAMPTZ DEFAULT now(),
+        FOREIGN KEY(user_id) REFERENCES users(user_id),
+        UNIQUE(user_id, job_name)
+    );
+    ALTER TABLE user_jobs ADD COLUMN IF NOT EXISTS latest_submission_id BIGINT;
+    -- UNIQUE(user_id, job_name) already backs both the per-user and the
+    -- (user_id, job_name) lookups; active-job scans only need the
+    -- active rows
+    DROP INDEX IF EXISTS idx_user_jobs_user_id;
+    DROP INDEX IF EXISTS idx_user_jobs_status;
+    CREATE INDEX IF NOT EXISTS idx_user_jobs_active ON user_jobs(user_id, job_name)
+        WHERE status = 'active';
+
+    -- Table for menores service submissions
+    CREATE TABLE IF NOT EXISTS menores_submissions (
+        id BIGINT GENERATED ALWAYS AS IDENTITY PRIMARY KEY,
+        user_id BIGINT NOT NULL,
+        job_name TEXT NOT NULL,
+        volume_page_number TEXT,
+        password TEXT,
+        preferred_date TEXT,
+        submitted_at TIMESTAMPTZ DEFAULT now(),
+        FOREIGN KEY(user_id) REFERENCES users(user_id)
+    );
+    CREATE INDEX IF NOT EXISTS idx_menores_sub_uid_job_time
+        ON menores_submissions(user_id, job_name, submitted_at DESC);
+
+    -- Children of a menores submission, one row per named child in
+    -- its form slot (1-3); the primary key indexes the lookup
+    CREATE TABLE IF NOT EXISTS menores_children (
+        submission_id BIGINT NOT NULL
+            REFERENCES menores_submissions(id) ON DELETE CASCADE,
+        slot SMALLINT NOT NULL,
+        identifier TEXT,
+        name TEXT,
+        birth_date TEXT,
+        PRIMARY KEY (submission_id, slot)
+    );
+
+    -- Move children out of the old wide child1..3 columns
+    DO $$
+    BEGIN
+        IF EXISTS (
+            SELECT 1 FROM information_schema.columns
+            WHERE table_name = 'menores_submissions' AND column_name = 'child1_name'
+        ) THEN
+            INSERT INTO menores_children (submission_id, slot, identifier, name, birth_date)
+            SELECT s.id, c.slot, c.identifier, c.name, c.birth_date
+            FROM menores_submissions s
+            CROSS JOIN LATERAL (VALUES
+                (1, s.child1_identifier, s.child1_name, s.child1_birth_date),
+                (2, s.child2_identifier, s.child2_name, s.child2_birth_date),
+                (3, s.child3_identifier, s.child3_name, s.child3_birth_date)
+            ) AS c(slot, identifier, name, birth_date)
+            WHERE c.name <> ''
+            ON CONFLICT DO NOTHING;
+
+            ALTER TABLE menores_submissions
+                DROP COLUMN child1_identifier, DROP COLUMN child1_name, DROP COLUMN child1_birth_date,
+                DROP COLUMN child2_identifier, DROP COLUMN child2_name, DROP COLUMN child2_birth_date,
+                DROP COLUMN child3_identifier, DROP COLUMN child3_name, DROP COLUMN child3_birth_date;
+        END IF;
+    END $$;
+
+    -- Table for certificate service submissions
+    CREATE TABLE IF NOT EXISTS certificate_submissions (
+        id BIGINT GENERATED ALWAYS AS IDENTITY PRIMARY KEY,
+        user_id BIGINT NOT NULL,
+        job_name TEXT NOT NULL,
+        carne_identidad TEXT,
+        contrasena TEXT,
+        tomo TEXT,
+        pagina TEXT,
+        visado_mark TEXT DEFAULT 'x',
+        preferred_date TEXT,
+        cert_type TEXT,  -- 'nacimiento' or 'dni'
+        submitted_at TIMESTAMPTZ DEFAULT now(),
+        FOREIGN KEY(user_id) REFERENCES users(user_id)
+    );
+    CREATE INDEX IF NOT EXISTS idx_certificate_sub_uid_job_time
+        ON certificate_submissions(user_id, job_name, submitted_at DESC);
+
+    -- Point jobs saved before latest_submission_id existed at their
+    -- newest submission
+    UPDATE user_jobs j
+    SET latest_submission_id = CASE
+        WHEN j.service_type = 'menores' THEN (
+            SELECT s.id FROM menores_submissions s
+            WHERE s.user_id = j.user_id AND s.job_name = j.job_name
+            ORDER BY s.submitted_at DESC
+            LIMIT 1
+        )
+        ELSE (
+            SELECT s.id FROM certificate_submissions s
+            WHERE s.user_id = j.user_id AND s.job_name = j.job_name
+            ORDER BY s.submitted_at DESC
+            LIMIT 1
+        )
+    END
+    WHERE j.latest_submission_id IS NULL;
+
+    -- Tables left over from the old start-up DDL have SERIAL (int4) keys
+    -- and TIMESTAMP columns. Naive values are read in the session's time
+    -- zone, the one now() wrote them in.
+    DO $$
+    DECLARE
+        t text;
+        seq text;
+        c record;
+    BEGIN
+        FOREACH t IN ARRAY ARRAY['users', 'user_jobs', 'menores_submissions', 'certificate_submissions'] LOOP
+            IF EXISTS (
+                SELECT 1 FROM information_schema.columns
+                WHERE table_schema = current_schema() AND table_name = t
+                  AND column_name = 'id' AND data_type = 'integer'
+            ) THEN
+                seq := pg_get_serial_sequence(t, 'id');
+                EXECUTE format('ALTER TABLE %I ALTER COLUMN id DROP DEFAULT', t);
+                IF seq IS NOT NULL THEN
+                    EXECUTE 'DROP SEQUENCE ' || seq;
+                END IF;
+                EXECUTE format('ALTER TABLE %I ALTER COLUMN id TYPE bigint', t);
+                EXECUTE format('ALTER TABLE %I ALTER COLUMN id ADD GENERATED ALWAYS AS IDENTITY', t);
+                EXECUTE format(
+                    'SELECT setval(pg_get_serial_sequence(%L, ''id''), COALESCE(max(id), 0) + 1, false) FROM %I',
+                    t, t
+                );
+            END IF;
+        END LOOP;
+
+        FOR c IN
+            SELECT table_name, column_name FROM information_schema.columns
+            WHERE table_schema = current_schema()
+              AND table_name IN ('users', 'user_jobs', 'menores_submissions', 'certificate_submissions')
+              AND data_type = 'timestamp without time zone'
+        LOOP
+            EXECUTE format('ALTER TABLE %I ALTER COLUMN %I TYPE timestamptz', c.table_name, c.column_name);
+        END LOOP;
+    END $$;
+"""
+
+
+def upgrade():
+    op.execute(SCHEMA_SQL)
+
+
+def downgrade():
+    op.execute("""
+    DROP TABLE IF EXISTS menores_children;
+    DROP TABLE IF EXISTS menores_submissions;
+    DROP TABLE IF EXISTS certificate_submissions;
+    DROP TABLE IF EXISTS user_jobs;
+    DROP TABLE IF EXISTS users;
+    """)
@@ -0,0 +1,34 @@
+"""Leave free space for HOT updates on users and user_jobs
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-16
+"""
+from alembic import op
+
+
+revision = '0002'
+down_revision = '0001'
+branch_labels = None
+depends_on = None
+
+
+# users.last_interaction and user_jobs.latest_submission_id are rewritten
+# all the time; with free room on the page Postgres can keep the new row
+# version there (a HOT update) and skip index maintenance. Status changes
+# are never HOT, since status is in idx_user_jobs_active's predicate, but
+# still reuse the page's free space.
+# Only pages written from now on get the room; a VACUUM FULL applies it to
+# the existing ones. The submission tables are append-only and stay at 100.
+def upgrade():
+    op.execute("""
+    ALTER TABLE users SET (fillfactor = 70);
+    ALTER TABLE user_jobs SET (fillfactor = 70);
+    """)
+
+
+def downgrade():
+    op.execute("""
+    ALTER TABLE users RESET (fillfactor);
+    ALTER TABLE user_jobs RESET (fillfactor);
+    """)
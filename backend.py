@@ -1,26 +1,31 @@
-from flask import Flask, request, jsonify
-from flask_cors import CORS
-import requests
+from quart import Quart, request, jsonify
+from quart.json.provider import DefaultJSONProvider
+from quart_cors import cors
+import httpx
+import orjson
+import redis.asyncio as aioredis
+from cachetools import TTLCache
+from collections import defaultdict
+from itertools import combinations
 import os
 import asyncio
 import logging
-import threading
-import json
 import traceback
 from dotenv import load_dotenv
 from sqlalchemy import text
-from error_logger import log_error, send_user_friendly_message
+from error_logger import TG_SESSION, log_error, send_user_friendly_message
 
 # Import the async database functions
-from bot_users import initialize_db, upsert_user, save_form_submission
-from database import SessionLocal
+from bot_users import initialize_db, save_user_and_form
+from database import get_async_engine
 
 # Load environment variables
 load_dotenv()
 
 # Setup logging with rotation and more detailed configuration
-import logging
-from logging.handlers import RotatingFileHandler
+from logging.handlers import RotatingFileHandler, QueueHandler, QueueListener
+import queue
+import atexit
 
 def setup_logging():
     log_formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
@@ -35,17 +40,33 @@ def setup_logging():
     file_handler.setFormatter(log_formatter)
     file_handler.setLevel(logging.DEBUG)
 
+    # Records are only enqueued on the calling thread; a listener thread does
+    # the console/file writes and rotation so requests never block on disk
+    log_queue = queue.Queue(-1)
+    listener = QueueListener(log_queue, console_handler, file_handler, respect_handler_level=True)
+    listener.start()
+    atexit.register(listener.stop)
+
     # Configure root logger
     logging.basicConfig(
         level=logging.INFO,
-        handlers=[console_handler, file_handler]
+        handlers=[QueueHandler(log_queue)]
     )
 
 setup_logging()
 logger = logging.getLogger(__name__)
 
-app = Flask(__name__)
-CORS(app)  # Enable CORS for all routes
+class OrjsonProvider(DefaultJSONProvider):
+    """JSON provider that encodes and decodes with orjson."""
+
+    def dumps(self, obj, **kwargs):
+        return orjson.dumps(obj, default=self.default).decode()
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+app = Quart(__name__)
+app.json = OrjsonProvider(app)
 
 # Validate and retrieve configuration
 def get_config(key, default=None, required=False):
@@ -57,143 +78,311 @@ def get_config(key, default=None, required=False):
 
 # Get critical configuration
 TELEGRAM_BOT_TOKEN = get_config('TELEGRAM_BOT_TOKEN', required=True)
-TELEGRAM_API_URL = f"https://api.telegram.org/bot{TELEGRAM_BOT_TOKEN}/sendMessage"
+TELEGRAM_API_BASE = f"https://api.telegram.org/bot{TELEGRAM_BOT_TOKEN}"
 DATABASE_URL = get_config('DATABASE_URL', required=True)
-
-# Helper function to run async code from Flask with enhanced error handling
-def run_async(coro, timeout=30):
-    """Run async coroutine with timeout and comprehensive error handling."""
-    loop = asyncio.new_event_loop()
-    asyncio.set_event_loop(loop)
-    try:
-        return loop.run_until_complete(asyncio.wait_for(coro, timeout))
-    except asyncio.TimeoutError:
-        logger.error(f"Async operation timed out after {timeout} seconds")
-        raise
-    except Exception as e:
-        logger.error(f"Error in async operation: {e}")
-        raise
-    finally:
-        loop.close()
+FORM_WORKERS = int(get_config('FORM_WORKERS', 16))
+FORM_QUEUE_SIZE = int(get_config('FORM_QUEUE_SIZE', 1000))
+# When set, submissions go through a shared Redis list instead of the
+# in-process queue, so any backend process can pick them up
+REDIS_URL = get_config('REDIS_URL')
+FORM_QUEUE_KEY = get_config('FORM_QUEUE_KEY', 'forms')
+FRONTEND_ORIGIN = get_config('FRONTEND_ORIGIN', 'https://qub1ck.github.io')
+
+# Only the hosted registration forms call this API; let browsers cache the
+# preflight for a day so repeat submissions skip the OPTIONS round-trip
+app = cors(app, allow_origin=FRONTEND_ORIGIN, allow_methods=["GET", "POST"], max_age=86400)
+
+# Transient Telegram failures worth retrying, with a short exponential backoff
+TELEGRAM_MAX_RETRIES = 3
+TELEGRAM_RETRY_STATUSES = frozenset({429, 502, 503, 504})
+_JSON_HEADERS = {"Content-Type": "application/json"}
+
+# Fail fast on a stalled database and retry the form save once
+DB_SAVE_TIMEOUT = 5
+DB_SAVE_ATTEMPTS = 2
+
+# Recently processed submissions, so client retries of an identical form
+# within a few minutes are not saved and announced twice
+_RECENT_SUBMISSIONS = TTLCache(maxsize=10000, ttl=300)
+
+# Form data served by /get-form-data, keyed by (chat_id, job_name). Saves
+# in this process invalidate their entry; the TTL bounds staleness for
+# preferred-date edits made by the bot.
+FORM_CACHE = TTLCache(maxsize=1024, ttl=30)
+FORM_CACHE_CONTROL = "private, max-age=10"
+
+# Mapping of form field names to database column names
+_FIELD_MAP = {
+    # Standard menores fields
+    'volumePageNumber': 'volume_page_number',
+    'password': 'password',
+    'child1Identifier': 'child1_identifier',
+    'child1Name': 'child1_name',
+    'child1BirthDate': 'child1_birth_date',
+    'child2Identifier': 'child2_identifier',
+    'child2Name': 'child2_name',
+    'child2BirthDate': 'child2_birth_date',
+    'child3Identifier': 'child3_identifier',
+    'child3Name': 'child3_name',
+    'child3BirthDate': 'child3_birth_date',
+
+    # Certificate fields
+    'carneIdentidad': 'carne_identidad',
+    'contrasena': 'contrasena',
+    'tomo': 'tomo',
+    'pagina': 'pagina',
+    'visado_mark': 'visado_mark',
+}
+
+# Request parameters that are not part of the submitted form data
+_IGNORED_FIELDS = frozenset({'chat_id', 'job_name', 'service_type'})
+
+# Field names the hosted forms actually send, already in column form
+_FORM_FIELDS = (
+    'volume_page_number', 'password',
+    'child1_identifier', 'child1_name', 'child1_birth_date',
+    'child2_identifier', 'child2_name', 'child2_birth_date',
+    'child3_identifier', 'child3_name', 'child3_birth_date',
+    'carne_identidad', 'contrasena', 'tomo', 'pagina', 'visado_mark',
+    'preferred_date',
+)
+
+# Precomputed column for every known field name (None for ignored
+# parameters), so the common case is a single dict lookup per field
+_FIELD_TRANSFORM = {
+    **{field: field for field in _FORM_FIELDS},
+    **_FIELD_MAP,
+    **dict.fromkeys(_IGNORED_FIELDS),
+}
+
+# (number, identifier, name, birth date) columns for each menores child
+_CHILD_FIELDS = tuple(
+    (i, f"child{i}_identifier", f"child{i}_name", f"child{i}_birth_date")
+    for i in (1, 2, 3)
+)
+
+# Submission message templates, one per combination of filled-in children,
+# rendered with a single format_map per form
+_SUBMISSION_HEADER = "Form Submission Received:\n\n"
+_SUBMISSION_FOOTER = "Registration form submitted successfully. Automatic search will start."
+_CHILD_TEMPLATE = (
+    "Child {i}:\n"
+    "Identifier: {{child{i}_identifier}}\n"
+    "Name: {{child{i}_name}}\n"
+    "Birth Date: {{child{i}_birth_date}}\n\n"
+)
+_MENORES_TEMPLATES = {
+    present: (
+        _SUBMISSION_HEADER
+        + "Parent Identifier:\nVolume Page Number: {volume_page_number}\n\n"
+        + "".join(_CHILD_TEMPLATE.format(i=i) for i in present)
+        + _SUBMISSION_FOOTER
+    )
+    for count in range(len(_CHILD_FIELDS) + 1)
+    for present in combinations([child[0] for child in _CHILD_FIELDS], count)
+}
+_CERTIFICATE_TEMPLATE = (
+    _SUBMISSION_HEADER
+    + "Certificate Request Details:\n"
+    "Carné de Identidad: {carne_identidad}\n"
+    "Tomo: {tomo}\n"
+    "Página: {pagina}\n\n"
+    + _SUBMISSION_FOOTER
+)
+
+def _column_for(key):
+    """Return the column name for a submitted field, or None if it is not form data."""
+    if key in _FIELD_TRANSFORM:
+        return _FIELD_TRANSFORM[key]
+    # For any fields not in our mapping, use the original transformation
+    lowered = key.lower()
+    return None if lowered in _IGNORED_FIELDS else lowered.replace(" ", "_")
 
 # Initialize database at startup with retry mechanism
-def initialize_database():
+async def initialize_database():
     """Initialize database with retry logic."""
     max_retries = 3
     for attempt in range(max_retries):
         try:
-            run_async(initialize_db())
+            await initialize_db()
             logger.info("Database initialized successfully.")
             return
         except Exception as e:
-            logger.error(f"Database initialization attempt {attempt + 1} failed: {e}")
+            logger.error("Database initialization attempt %s failed: %s", attempt + 1, e)
             if attempt == max_retries - 1:
                 logger.critical("Failed to initialize database after multiple attempts.")
                 raise
-
-# Call initialization at module import
-initialize_database()
+            await asyncio.sleep(0.5 * 2 ** attempt)
+
+@app.before_serving
+async def startup():
+    """Run one-time initialization on the server's event loop."""
+    # Shared async HTTP/2 client so concurrent Telegram calls multiplex over
+    # a few keep-alive connections
+    app.tg_client = httpx.AsyncClient(
+        base_url=TELEGRAM_API_BASE,
+        http2=True,
+        timeout=10.0,
+        limits=httpx.Limits(max_connections=100, max_keepalive_connections=50)
+    )
+    # Create the schema in the background so a slow database does not hold
+    # up serving; workers wait for it before touching any tables
+    app.db_init = asyncio.create_task(initialize_database())
+
+    # Fixed pool of workers draining the queue of submitted forms
+    if REDIS_URL:
+        app.redis = aioredis.from_url(REDIS_URL)
+        app.form_workers = [asyncio.create_task(redis_form_worker(app.redis)) for _ in range(FORM_WORKERS)]
+    else:
+        app.work_q = asyncio.Queue(maxsize=FORM_QUEUE_SIZE)
+        app.form_workers = [asyncio.create_task(form_worker(app.work_q)) for _ in range(FORM_WORKERS)]
+
+@app.after_serving
+async def shutdown():
+    """Release resources held for the lifetime of the server."""
+    for worker in app.form_workers:
+        worker.cancel()
+    app.db_init.cancel()
+    await asyncio.gather(app.db_init, *app.form_workers, return_exceptions=True)
+    await app.tg_client.aclose()
+    if REDIS_URL:
+        await app.redis.aclose()
+    await get_async_engine().dispose()
+
+async def form_worker(queue):
+    """Process queued form submissions one at a time."""
+    await asyncio.wait([app.db_init])
+    while True:
+        job = await queue.get()
+        try:
+            await process_form_in_background_async(*job)
+        finally:
+            queue.task_done()
+
+async def redis_form_worker(client):
+    """Process form submissions popped from the shared Redis list."""
+    await asyncio.wait([app.db_init])
+    while True:
+        try:
+            _, payload = await client.brpop(FORM_QUEUE_KEY)
+        except aioredis.RedisError as e:
+            logger.error("Failed to read from form queue: %s", e)
+            await asyncio.sleep(1)
+            continue
+        await process_form_in_background_async(*orjson.loads(payload))
+
+async def _enqueue_form(chat_id, job_name, user_input):
+    """Queue a submission for the workers; returns False if it cannot be accepted."""
+    if REDIS_URL:
+        try:
+            await app.redis.lpush(FORM_QUEUE_KEY, orjson.dumps((chat_id, job_name, user_input)))
+        except aioredis.RedisError as e:
+            logger.error("Failed to push to form queue: %s", e)
+            return False
+        return True
+    try:
+        app.work_q.put_nowait((chat_id, job_name, user_input))
+    except asyncio.QueueFull:
+        return False
+    return True
 
 # Background processing with improved error tracking
-def process_form_in_background(chat_id, job_name, user_input):
+async def process_form_in_background_async(chat_id, job_name, user_input):
     """Enhanced background processing with comprehensive logging and error handling."""
-    try:
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
+    dedup_key = (chat_id, job_name, hash(tuple(sorted(user_input.items()))))
+    if dedup_key in _RECENT_SUBMISSIONS:
+        logger.info("Skipping duplicate submission: User %s, Job %s", chat_id, job_name)
+        return
+    _RECENT_SUBMISSIONS[dedup_key] = True
 
+    try:
         # Redact sensitive information in logs
-        log_safe_input = {k: v for k, v in user_input.items() if k not in ['password']}
-        logger.info(f"Background processing started: User {chat_id}, Job {job_name}")
-        logger.debug(f"User Input (Sanitized): {json.dumps(log_safe_input, indent=2)}")
-
-        # Save form submission with timeout
-        success = loop.run_until_complete(
-            asyncio.wait_for(save_form_submission(chat_id, user_input, job_name), timeout=60)
-        )
+        logger.info("Background processing started: User %s, Job %s", chat_id, job_name)
+        if logger.isEnabledFor(logging.DEBUG):
+            log_safe_input = {k: v for k, v in user_input.items() if k not in ['password']}
+            logger.debug("User Input (Sanitized): %s", orjson.dumps(log_safe_input).decode())
+
+        # Upsert the user and save the form submission in one transaction
+        success = False
+        for attempt in range(DB_SAVE_ATTEMPTS):
+            try:
+                success = await asyncio.wait_for(
+                    save_user_and_form(chat_id, user_input, job_name), timeout=DB_SAVE_TIMEOUT
+                )
+                break
+            except asyncio.TimeoutError:
+                logger.warning("Form save timed out (attempt %s/%s) for user %s, job %s",
+                               attempt + 1, DB_SAVE_ATTEMPTS, chat_id, job_name)
+                if attempt < DB_SAVE_ATTEMPTS - 1:
+                    await asyncio.sleep(0.2)
 
         if not success:
-            logger.error(f"Form submission failed for user {chat_id}, job {job_name}")
-            _send_error_message(chat_id, "Form submission processing error")
+            logger.error("Form submission failed for user %s, job %s", chat_id, job_name)
+            _RECENT_SUBMISSIONS.pop(dedup_key, None)
+            await _send_error_message(chat_id, "Form submission processing error")
             return
 
+        FORM_CACHE.pop((chat_id, job_name), None)
+
         # Construct detailed message with minimal sensitive information
+        # and fold the search-start notice into the same sendMessage call
         message = _construct_submission_message(user_input)
-        _send_telegram_message(chat_id, message)
-        _send_search_start_message(chat_id, job_name)
+        message += f"\n\nStarting automatic search for {job_name}."
+        await _send_telegram_message(app.tg_client, chat_id, message)
 
     except Exception as e:
-        logger.error(f"Comprehensive error in background processing: {e}")
-        logger.error(f"Full traceback: {traceback.format_exc()}")
-        _send_error_message(chat_id, "Unexpected error during processing")
-    finally:
-        loop.close()
-
-def _send_telegram_message(chat_id, message):
-    """Send Telegram message with robust error handling."""
-    try:
-        response = requests.post(TELEGRAM_API_URL, json={"chat_id": chat_id, "text": message}, timeout=10)
-        response.raise_for_status()
-    except requests.RequestException as e:
-        logger.error(f"Failed to send Telegram message: {e}")
+        logger.error("Comprehensive error in background processing: %s", e)
+        logger.error("Full traceback: %s", traceback.format_exc())
+        _RECENT_SUBMISSIONS.pop(dedup_key, None)
+        await _send_error_message(chat_id, "Unexpected error during processing")
+
+async def _send_telegram_message(client, chat_id, message):
+    """Send Telegram message, retrying transient failures with a short backoff."""
+    for attempt in range(TELEGRAM_MAX_RETRIES + 1):
+        try:
+            response = await client.post(
+                "/sendMessage",
+                content=orjson.dumps({"chat_id": chat_id, "text": message}),
+                headers=_JSON_HEADERS
+            )
+            if response.status_code not in TELEGRAM_RETRY_STATUSES or attempt == TELEGRAM_MAX_RETRIES:
+                response.raise_for_status()
+                return
+        except httpx.TransportError as e:
+            if attempt == TELEGRAM_MAX_RETRIES:
+                logger.error("Failed to send Telegram message: %s", e)
+                return
+        except httpx.HTTPError as e:
+            logger.error("Failed to send Telegram message: %s", e)
+            return
+        await asyncio.sleep(0.2 * 2 ** attempt)
 
-def _send_error_message(chat_id, error_text):
+async def _send_error_message(chat_id, error_text):
     """Send a standardized error message."""
     try:
-        # Log error to monitoring bot instead of showing details to user
-        log_error(chat_id, error_text)
-        
-        # Send generic message to user
-        send_user_friendly_message(
-            TELEGRAM_BOT_TOKEN, 
-            chat_id
-        )
-    except requests.RequestException as e:
-        logger.error(f"Failed to handle error messaging: {e}")
+        # Log error to monitoring bot instead of showing details to user and
+        # send the generic user message; both only enqueue, so no thread hop
+        log_error(chat_id, error_text, session=TG_SESSION)
+        send_user_friendly_message(TELEGRAM_BOT_TOKEN, chat_id, session=TG_SESSION)
+    except Exception as e:
+        logger.error("Failed to handle error messaging: %s", e)
 
 def _construct_submission_message(user_input):
     """Construct a safe submission message."""
-    service_type = user_input.get('service_type', 'menores')
-    message = "Form Submission Received:\n\n"
-    
-    if service_type == "menores":
-        message += f"Parent Identifier:\nVolume Page Number: {user_input.get('volume_page_number', 'N/A')}\n\n"
-        
-        # Dynamically handle children based on available data
-        for i in range(1, 4):
-            child_prefix = f"child{i}_"
-            if user_input.get(f"{child_prefix}name"):
-                message += f"Child {i}:\n"
-                message += f"Identifier: {user_input.get(f'{child_prefix}identifier', 'N/A')}\n"
-                message += f"Name: {user_input.get(f'{child_prefix}name', 'N/A')}\n"
-                message += f"Birth Date: {user_input.get(f'{child_prefix}birth_date', 'N/A')}\n\n"
-    else:
-        # Certificate service fields
-        message += f"Certificate Request Details:\n"
-        message += f"Carné de Identidad: {user_input.get('carne_identidad', 'N/A')}\n"
-        message += f"Tomo: {user_input.get('tomo', 'N/A')}\n"
-        message += f"Página: {user_input.get('pagina', 'N/A')}\n\n"
-    
-    message += "Registration form submitted successfully. Automatic search will start."
-    return message
-
-def _send_search_start_message(chat_id, job_name):
-    """Send a search start notification."""
-    try:
-        requests.post(
-            TELEGRAM_API_URL, 
-            json={"chat_id": chat_id, "text": f"Starting automatic search for {job_name}."},
-            timeout=10
-        )
-    except requests.RequestException as e:
-        logger.error(f"Failed to send search start message: {e}")
+    fields = defaultdict(lambda: 'N/A', user_input)
+    if user_input.get('service_type', 'menores') == "menores":
+        # Only children with a name are listed
+        present = tuple(i for i, _, name_key, _ in _CHILD_FIELDS if user_input.get(name_key))
+        return _MENORES_TEMPLATES[present].format_map(fields)
+    return _CERTIFICATE_TEMPLATE.format_map(fields)
 
 
 @app.route("/submit-form", methods=["POST"])
-def handle_form_submission():
+async def handle_form_submission():
     """Robust form submission handler with comprehensive validation and processing."""
     try:
         # Extract and validate form data
-        data = request.form
+        data = await request.form
         logger.info("Form Submission Received")
 
         # Validate critical parameters
@@ -202,60 +391,36 @@ def handle_form_submission():
         service_type = data.get("service_type", "menores")
 
         if not chat_id or not job_name:
-            logger.error(f"Missing parameters: chat_id={chat_id}, job_name={job_name}")
+            logger.error("Missing parameters: chat_id=%s, job_name=%s", chat_id, job_name)
             return jsonify({"status": "error", "message": "Missing required parameters"}), 400
 
-        # Create a mapping for form field names to database column names
-        field_mapping = {
-            # Standard menores fields
-            'volumePageNumber': 'volume_page_number',
-            'password': 'password',
-            'child1Identifier': 'child1_identifier',
-            'child1Name': 'child1_name',
-            'child1BirthDate': 'child1_birth_date',
-            'child2Identifier': 'child2_identifier',
-            'child2Name': 'child2_name',
-            'child2BirthDate': 'child2_birth_date',
-            'child3Identifier': 'child3_identifier',
-            'child3Name': 'child3_name',
-            'child3BirthDate': 'child3_birth_date',
-
-            # Certificate fields
-            'carneIdentidad': 'carne_identidad',
-            'contrasena': 'contrasena',
-            'tomo': 'tomo',
-            'pagina': 'pagina',
-            'visado_mark': 'visado_mark',
+        # asyncpg binds BIGINT parameters strictly, so normalise the id up front
+        try:
+            chat_id = int(chat_id)
+        except ValueError:
+            logger.error("Invalid chat_id: %s", chat_id)
+            return jsonify({"status": "error", "message": "Invalid chat_id"}), 400
+
+        # Transform form data using the precomputed field mapping
+        user_input = {
+            column: value
+            for key, value in data.items()
+            if (column := _column_for(key)) is not None
         }
 
-        # Transform form data using the mapping
-        user_input = {}
-        for key, value in data.items():
-            if key in field_mapping:
-                user_input[field_mapping[key]] = value
-            elif key.lower() not in ['chat_id', 'job_name', 'service_type']:
-                # For any fields not in our mapping, use the original transformation
-                user_input[key.lower().replace(" ", "_")] = value
-
         # Add service type
         user_input['service_type'] = service_type
 
         # Log the transformed data for debugging (excluding password)
         safe_input = {k: v for k, v in user_input.items() if k not in ['password', 'contrasena']}
-        logger.info(f"Transformed form data: {safe_input}")
-
-        # Quick user upsert to ensure user exists
-        run_async(upsert_user(chat_id))
+        logger.info("Transformed form data: %s", safe_input)
 
-        # Start background processing
-        thread = threading.Thread(
-            target=process_form_in_background,
-            args=(chat_id, job_name, user_input)
-        )
-        thread.daemon = True
-        thread.start()
+        # Hand off to the background workers, shedding load if they are saturated
+        if not await _enqueue_form(chat_id, job_name, user_input):
+            logger.error("Form queue unavailable, rejecting submission: User %s, Job %s", chat_id, job_name)
+            return jsonify({"status": "error", "message": "Server busy, please try again shortly"}), 503
 
-        logger.info(f"Background processing initiated: User {chat_id}, Job {job_name}")
+        logger.info("Background processing initiated: User %s, Job %s", chat_id, job_name)
 
         return jsonify({
             "status": "success",
@@ -263,13 +428,22 @@ def handle_form_submission():
         })
 
     except Exception as e:
-        logger.error(f"Form submission error: {e}")
-        logger.error(f"Full traceback: {traceback.format_exc()}")
+        logger.error("Form submission error: %s", e)
+        logger.error("Full traceback: %s", traceback.format_exc())
         return jsonify({"status": "error", "message": "Internal server error"}), 500
 
 
+def _form_data_response(form_data):
+    """Build the /get-form-data success response."""
+    response = jsonify({
+        "status": "success",
+        "form_data": form_data
+    })
+    response.headers["Cache-Control"] = FORM_CACHE_CONTROL
+    return response
+
 @app.route("/get-form-data", methods=["GET"])
-def get_form_data():
+async def get_form_data():
     """Get form data for a specific user's job."""
     try:
         # Extract and validate parameters
@@ -277,90 +451,75 @@ def get_form_data():
         job_name = request.args.get("job_name")
 
         if not chat_id or not job_name:
-            logger.error(f"Missing required parameters: chat_id={chat_id}, job_name={job_name}")
+            logger.error("Missing required parameters: chat_id=%s, job_name=%s", chat_id, job_name)
             return jsonify({"status": "error", "message": "Missing required parameters"}), 400
 
-        # First get the service type from the user_jobs table
-        with SessionLocal() as session:
-            service_type_result = session.execute(text("""
-                SELECT service_type FROM user_jobs
+        # asyncpg binds BIGINT parameters strictly, so normalise the id up front
+        try:
+            chat_id = int(chat_id)
+        except ValueError:
+            logger.error("Invalid chat_id: %s", chat_id)
+            return jsonify({"status": "error", "message": "Invalid chat_id"}), 400
+
+        cache_key = (chat_id, job_name)
+        form_data = FORM_CACHE.get(cache_key)
+        if form_data is not None:
+            return _form_data_response(form_data)
+
+        # First get the service type and latest submission from the user_jobs table
+        async with get_async_engine().connect() as conn:
+            job_result = (await conn.execute(text("""
+                SELECT service_type, latest_submission_id FROM user_jobs
                 WHERE user_id = :user_id AND job_name = :job_name
                 LIMIT 1
-            """), {"user_id": chat_id, "job_name": job_name}).fetchone()
+            """), {"user_id": chat_id, "job_name": job_name})).fetchone()
 
-            if not service_type_result:
+            if not job_result:
                 return jsonify({"status": "error", "message": "No job found"}), 404
 
-            service_type = service_type_result[0]
+            service_type, submission_id = job_result
+            if submission_id is None:
+                return jsonify({"status": "error", "message": "No form data found"}), 404
 
             if service_type == "menores":
                 # Query for menores service data
-                result = session.execute(text("""
-                    SELECT volume_page_number, password, 
-                           child1_identifier, child1_name, child1_birth_date,
-                           child2_identifier, child2_name, child2_birth_date,
-                           child3_identifier, child3_name, child3_birth_date,
-                           preferred_date
-                    FROM menores_submissions
-                    WHERE user_id = :user_id AND job_name = :job_name
-                    ORDER BY submitted_at DESC
-                    LIMIT 1
-                """), {"user_id": chat_id, "job_name": job_name}).fetchone()
-
-                if not result:
-                    return jsonify({"status": "error", "message": "No form data found"}), 404
-
-                # Create a dictionary from the result
-                form_data = {
-                    "volume_page_number": result[0],
-                    "password": result[1],
-                    "child1_identifier": result[2],
-                    "child1_name": result[3],
-                    "child1_birth_date": result[4],
-                    "child2_identifier": result[5],
-                    "child2_name": result[6],
-                    "child2_birth_date": result[7],
-                    "child3_identifier": result[8],
-                    "child3_name": result[9],
-                    "child3_birth_date": result[10],
-                    "preferred_date": result[11],
-                    "service_type": service_type
-                }
+                result = (await conn.execute(text("""
+                    SELECT s.volume_page_number, s.password,
+                           c1.identifier AS child1_identifier, c1.name AS child1_name,
+                           c1.birth_date AS child1_birth_date,
+                           COALESCE(c2.identifier, '') AS child2_identifier,
+                           COALESCE(c2.name, '') AS child2_name,
+                           COALESCE(c2.birth_date, '') AS child2_birth_date,
+                           COALESCE(c3.identifier, '') AS child3_identifier,
+                           COALESCE(c3.name, '') AS child3_name,
+                           COALESCE(c3.birth_date, '') AS child3_birth_date,
+                           s.preferred_date
+                    FROM menores_submissions s
+                    LEFT JOIN menores_children c1 ON c1.submission_id = s.id AND c1.slot = 1
+                    LEFT JOIN menores_children c2 ON c2.submission_id = s.id AND c2.slot = 2
+                    LEFT JOIN menores_children c3 ON c3.submission_id = s.id AND c3.slot = 3
+                    WHERE s.id = :id
+                """), {"id": submission_id})).mappings().first()
             else:
                 # Query for certificate service data
-                result = session.execute(text("""
+                result = (await conn.execute(text("""
                     SELECT carne_identidad, contrasena, tomo, pagina, visado_mark, preferred_date, cert_type
                     FROM certificate_submissions
-                    WHERE user_id = :user_id AND job_name = :job_name
-                    ORDER BY submitted_at DESC
-                    LIMIT 1
-                """), {"user_id": chat_id, "job_name": job_name}).fetchone()
-
-                if not result:
-                    return jsonify({"status": "error", "message": "No form data found"}), 404
-
-                # Create a dictionary from the result
-                form_data = {
-                    "carne_identidad": result[0],
-                    "contrasena": result[1],
-                    "tomo": result[2],
-                    "pagina": result[3],
-                    "visado_mark": result[4],
-                    "preferred_date": result[5],
-                    "cert_type": result[6],
-                    "service_type": service_type
-                }
-
-            # Return the form data
-            return jsonify({
-                "status": "success",
-                "form_data": form_data
-            })
+                    WHERE id = :id
+                """), {"id": submission_id})).mappings().first()
+
+            if not result:
+                return jsonify({"status": "error", "message": "No form data found"}), 404
+
+            # Build the response dict straight from the row's column mapping
+            form_data = {**result, "service_type": service_type}
+
+        FORM_CACHE[cache_key] = form_data
+
+        # Return the form data
+        return _form_data_response(form_data)
 
     except Exception as e:
-        logger.error(f"Error retrieving form data: {e}")
-        logger.error(f"Full traceback: {traceback.format_exc()}")
+        logger.error("Error retrieving form data: %s", e)
+        logger.error("Full traceback: %s", traceback.format_exc())
         return jsonify({"status": "error", "message": "Internal server error"}), 500
-
-if __name__ == "__main__":
-    app.run(host="0.0.0.0", port=int(get_config('PORT', 5000)))
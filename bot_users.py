@@ -1,118 +1,320 @@
+import asyncio
 import logging
 import traceback
 from sqlalchemy.exc import SQLAlchemyError
 from sqlalchemy import text
-from database import SessionLocal, init_db
+from database import get_async_engine, get_listen_engine, init_db
 
 logger = logging.getLogger(__name__)
 
+# Channel notified with "<user_id>:<job_name>" when a form submission
+# activates a job; delivered to listeners when the transaction commits
+FORM_READY_CHANNEL = "form_ready"
+
+# SQL statements are built once at import and reused on every call
+_UPSERT_USER_SQL = text("""
+    INSERT INTO users (user_id)
+    VALUES (:user_id)
+    ON CONFLICT (user_id) DO UPDATE
+    SET last_interaction = CURRENT_TIMESTAMP;
+""")
+
+# The submission statements also upsert the user, so saving a form is a
+# single round-trip
+_INSERT_MENORES_SQL = text("""
+    WITH u AS (
+        INSERT INTO users (user_id)
+        VALUES (:user_id)
+        ON CONFLICT (user_id) DO UPDATE
+        SET last_interaction = CURRENT_TIMESTAMP
+        RETURNING user_id
+    ), ins AS (
+        INSERT INTO menores_submissions (
+            user_id, job_name, volume_page_number, password, preferred_date
+        )
+        SELECT u.user_id, :job_name, :volume_page_number, :password, :preferred_date
+        FROM u
+        RETURNING id, user_id, job_name
+    ), kids AS (
+        INSERT INTO menores_children (submission_id, slot, identifier, name, birth_date)
+        SELECT ins.id, c.slot, c.identifier, c.name, c.birth_date
+        FROM ins, (VALUES
+            (1, :child1_identifier, :child1_name, :child1_birth_date),
+            (2, :child2_identifier, :child2_name, :child2_birth_date),
+            (3, :child3_identifier, :child3_name, :child3_birth_date)
+        ) AS c(slot, identifier, name, birth_date)
+        WHERE c.name <> ''
+    )
+    UPDATE user_jobs
+    SET status = 'active', service_type = :service_type, latest_submission_id = ins.id
+    FROM ins
+    WHERE user_jobs.user_id = ins.user_id AND user_jobs.job_name = ins.job_name
+    RETURNING pg_notify('form_ready', user_jobs.user_id || ':' || user_jobs.job_name)
+""")
+
+_INSERT_CERTIFICATE_SQL = text("""
+    WITH u AS (
+        INSERT INTO users (user_id)
+        VALUES (:user_id)
+        ON CONFLICT (user_id) DO UPDATE
+        SET last_interaction = CURRENT_TIMESTAMP
+        RETURNING user_id
+    ), ins AS (
+        INSERT INTO certificate_submissions (
+            user_id, job_name, preferred_date, cert_type,
+            carne_identidad, contrasena, tomo, pagina, visado_mark
+        )
+        SELECT
+            u.user_id, :job_name, :preferred_date, :cert_type,
+            :carne_identidad, :contrasena, :tomo, :pagina, :visado_mark
+        FROM u
+        RETURNING id, user_id, job_name
+    )
+    UPDATE user_jobs
+    SET status = 'active', service_type = :service_type, latest_submission_id = ins.id
+    FROM ins
+    WHERE user_jobs.user_id = ins.user_id AND user_jobs.job_name = ins.job_name
+    RETURNING pg_notify('form_ready', user_jobs.user_id || ':' || user_jobs.job_name)
+""")
+
+_INSERT_USER_JOB_SQL = text("""
+    INSERT INTO user_jobs (user_id, job_name, status, service_type)
+    VALUES (:user_id, :job_name, 'pending_form', :service_type)
+""")
+
+_SELECT_JOB_STATUS_SQL = text("""
+    SELECT status FROM user_jobs
+    WHERE user_id = :user_id AND job_name = :job_name
+""")
+
+_SELECT_ACTIVE_JOBS_SQL = text("""
+    SELECT user_id, job_name, service_type FROM user_jobs
+    WHERE status = 'active'
+""")
+
+_SELECT_SERVICE_TYPE_SQL = text("""
+    SELECT service_type FROM user_jobs
+    WHERE user_id = :user_id AND job_name = :job_name
+    LIMIT 1
+""")
+
+_DELETE_MENORES_SQL = text("""
+    DELETE FROM menores_submissions
+    WHERE user_id = :user_id AND job_name = :job_name
+""")
+
+_DELETE_CERTIFICATE_SQL = text("""
+    DELETE FROM certificate_submissions
+    WHERE user_id = :user_id AND job_name = :job_name
+""")
+
+_DELETE_USER_JOB_SQL = text("""
+    DELETE FROM user_jobs
+    WHERE user_id = :user_id AND job_name = :job_name
+""")
+
+# Every job of a user and their submissions in one statement
+_DELETE_ALL_USER_JOBS_SQL = text("""
+    WITH m AS (
+        DELETE FROM menores_submissions WHERE user_id = :user_id
+    ), c AS (
+        DELETE FROM certificate_submissions WHERE user_id = :user_id
+    )
+    DELETE FROM user_jobs WHERE user_id = :user_id
+""")
+
+# Preferred date of the job's latest submission, found through the
+# latest_submission_id pointer instead of sorting the submissions
+_SELECT_PREFERRED_DATE_SQL = text("""
+    SELECT COALESCE(m.preferred_date, c.preferred_date)
+    FROM user_jobs j
+    LEFT JOIN menores_submissions m
+        ON j.service_type = 'menores' AND m.id = j.latest_submission_id
+    LEFT JOIN certificate_submissions c
+        ON j.service_type <> 'menores' AND c.id = j.latest_submission_id
+    WHERE j.user_id = :user_id AND j.job_name = :job_name
+""")
+
+_SELECT_USER_JOBS_SQL = text("""
+    SELECT job_name FROM user_jobs WHERE user_id = :user_id
+""")
+
+_SELECT_JOB_NAME_CHECK_SQL = text("""
+    SELECT COUNT(*), COALESCE(bool_or(lower(job_name) = lower(:job_name)), false)
+    FROM user_jobs WHERE user_id = :user_id
+""")
+
+_SELECT_MENORES_ID_SQL = text("""
+    SELECT id FROM menores_submissions
+    WHERE user_id = :user_id AND job_name = :job_name
+    LIMIT 1
+""")
+
+_UPDATE_MENORES_PREFERRED_DATE_SQL = text("""
+    UPDATE menores_submissions
+    SET preferred_date = :preferred_date
+    WHERE user_id = :user_id AND job_name = :job_name
+""")
+
+_INSERT_MENORES_PREFERRED_DATE_SQL = text("""
+    WITH ins AS (
+        INSERT INTO menores_submissions (user_id, job_name, preferred_date)
+        VALUES (:user_id, :job_name, :preferred_date)
+        RETURNING id, user_id, job_name
+    )
+    UPDATE user_jobs
+    SET latest_submission_id = ins.id
+    FROM ins
+    WHERE user_jobs.user_id = ins.user_id AND user_jobs.job_name = ins.job_name
+""")
+
+_SELECT_CERTIFICATE_ID_SQL = text("""
+    SELECT id FROM certificate_submissions
+    WHERE user_id = :user_id AND job_name = :job_name
+    LIMIT 1
+""")
+
+_UPDATE_CERTIFICATE_PREFERRED_DATE_SQL = text("""
+    UPDATE certificate_submissions
+    SET preferred_date = :preferred_date
+    WHERE user_id = :user_id AND job_name = :job_name
+""")
+
+_INSERT_CERTIFICATE_PREFERRED_DATE_SQL = text("""
+    WITH ins AS (
+        INSERT INTO certificate_submissions (user_id, job_name, preferred_date, cert_type)
+        VALUES (:user_id, :job_name, :preferred_date, :cert_type)
+        RETURNING id, user_id, job_name
+    )
+    UPDATE user_jobs
+    SET latest_submission_id = ins.id
+    FROM ins
+    WHERE user_jobs.user_id = ins.user_id AND user_jobs.job_name = ins.job_name
+""")
+
 
 async def initialize_db():
-    """Initialize the database."""
+    """Verify the database schema without blocking the loop; raises if it fails."""
     try:
-        init_db()
-        logger.info("Database tables created successfully.")
+        # init_db connects through the synchronous engine, so keep it off
+        # the event loop
+        await asyncio.to_thread(init_db)
+        logger.info("Database schema verified.")
     except Exception as e:
         logger.error(f"Error initializing database: {e}")
-        logger.error(f"Traceback: {traceback.format_exc()}")
+        raise
+
+
+async def listen_for_ready_forms(callback):
+    """
+    Call callback(user_id, job_name) on the running loop whenever a form
+    submission activates a job. Returns the dedicated connection holding
+    the LISTEN; close it to stop listening.
+    """
+    conn = await get_listen_engine().connect()
+    raw_conn = await conn.get_raw_connection()
+
+    def _on_notify(connection, pid, channel, payload):
+        user_id, job_name = payload.split(":", 1)
+        callback(int(user_id), job_name)
+
+    await raw_conn.driver_connection.add_listener(FORM_READY_CHANNEL, _on_notify)
+    logger.info(f"Listening for ready forms on channel '{FORM_READY_CHANNEL}'")
+    return conn
+
+
+async def is_listening(conn):
+    """
+    Whether a connection returned by listen_for_ready_forms is still up.
+    Round-trips a query on the raw connection, outside any transaction, so a
+    silently dropped socket is noticed and notifications keep flowing.
+    """
+    if conn.closed:
+        return False
+    driver_conn = (await conn.get_raw_connection()).driver_connection
+    if driver_conn.is_closed():
+        return False
+    try:
+        await asyncio.wait_for(driver_conn.fetchval("SELECT 1"), timeout=10)
+        return True
+    except Exception as e:
+        logger.warning(f"Ready-forms listener connection lost: {e}")
+        return False
+
+
+async def _upsert_user(conn, user_id):
+    """Upsert a user row on an already open connection."""
+    # Use raw SQL to handle upsert
+    await conn.execute(_UPSERT_USER_SQL, {"user_id": user_id})
 
 
 async def upsert_user(user_id):
     """Insert or update a user's last interaction timestamp."""
     try:
-        with SessionLocal() as session:
-            # Use raw SQL to handle upsert
-            session.execute(text("""
-                INSERT INTO users (user_id)
-                VALUES (:user_id)
-                ON CONFLICT (user_id) DO UPDATE
-                SET last_interaction = CURRENT_TIMESTAMP;
-            """), {"user_id": user_id})
-            session.commit()
+        async with get_async_engine().begin() as conn:
+            await _upsert_user(conn, user_id)
             logger.info(f"User {user_id} upserted in the 'users' table.")
     except SQLAlchemyError as e:
         logger.error(f"Error upserting user {user_id}: {e}")
         logger.error(f"Traceback: {traceback.format_exc()}")
 
 
-async def save_form_submission(user_id, form_data, job_name):
-    """Save form submission data to the database and update job status."""
+async def _insert_form_submission(conn, user_id, form_data, job_name):
+    """Upsert the user, write a form submission and activate its job on an already open connection."""
+    # Determine service type
+    service_type = form_data.get("service_type", "menores")
+
+    if service_type == "menores":
+        # Upsert the user, insert the menores submission and activate the
+        # job in the same statement
+        await conn.execute(_INSERT_MENORES_SQL, {
+            "user_id": user_id,
+            "job_name": job_name,
+            "service_type": service_type,
+            "volume_page_number": form_data.get("volume_page_number"),
+            "password": form_data.get("password"),
+            "child1_identifier": form_data.get("child1_identifier"),
+            "child1_name": form_data.get("child1_name"),
+            "child1_birth_date": form_data.get("child1_birth_date"),
+            "child2_identifier": form_data.get("child2_identifier", ""),
+            "child2_name": form_data.get("child2_name", ""),
+            "child2_birth_date": form_data.get("child2_birth_date", ""),
+            "child3_identifier": form_data.get("child3_identifier", ""),
+            "child3_name": form_data.get("child3_name", ""),
+            "child3_birth_date": form_data.get("child3_birth_date", ""),
+            "preferred_date": form_data.get("preferred_date", "")
+        })
+    else:
+        # Determine certificate type
+        cert_type = "nacimiento"
+        if "para DNI" in job_name:
+            cert_type = "dni"
+
+        # Upsert the user, insert the certificate submission and activate
+        # the job in the same statement
+        await conn.execute(_INSERT_CERTIFICATE_SQL, {
+            "user_id": user_id,
+            "job_name": job_name,
+            "service_type": service_type,
+            "preferred_date": form_data.get("preferred_date", ""),
+            "cert_type": cert_type,
+            "carne_identidad": form_data.get("carne_identidad", ""),
+            "contrasena": form_data.get("contrasena", ""),
+            "tomo": form_data.get("tomo", ""),
+            "pagina": form_data.get("pagina", ""),
+            "visado_mark": form_data.get("visado_mark", "x")  # Default to "x" for visado_mark
+        })
+
+
+async def save_user_and_form(user_id, form_data, job_name):
+    """Upsert the user and save their form submission in a single transaction."""
     try:
-        with SessionLocal() as session:
-            # Determine service type
-            service_type = form_data.get("service_type", "menores")
-
-            if service_type == "menores":
-                # Insert form submission for menores service
-                session.execute(text("""
-                    INSERT INTO menores_submissions (
-                        user_id, job_name, volume_page_number, password,
-                        child1_identifier, child1_name, child1_birth_date,
-                        child2_identifier, child2_name, child2_birth_date,
-                        child3_identifier, child3_name, child3_birth_date,
-                        preferred_date
-                    ) VALUES (
-                        :user_id, :job_name, :volume_page_number, :password,
-                        :child1_identifier, :child1_name, :child1_birth_date,
-                        :child2_identifier, :child2_name, :child2_birth_date,
-                        :child3_identifier, :child3_name, :child3_birth_date,
-                        :preferred_date
-                    )
-                """), {
-                    "user_id": user_id,
-                    "job_name": job_name,
-                    "volume_page_number": form_data.get("volume_page_number"),
-                    "password": form_data.get("password"),
-                    "child1_identifier": form_data.get("child1_identifier"),
-                    "child1_name": form_data.get("child1_name"),
-                    "child1_birth_date": form_data.get("child1_birth_date"),
-                    "child2_identifier": form_data.get("child2_identifier", ""),
-                    "child2_name": form_data.get("child2_name", ""),
-                    "child2_birth_date": form_data.get("child2_birth_date", ""),
-                    "child3_identifier": form_data.get("child3_identifier", ""),
-                    "child3_name": form_data.get("child3_name", ""),
-                    "child3_birth_date": form_data.get("child3_birth_date", ""),
-                    "preferred_date": form_data.get("preferred_date", "")
-                })
-            else:
-                # Determine certificate type
-                cert_type = "nacimiento"
-                if "para DNI" in job_name:
-                    cert_type = "dni"
-
-                # Insert form submission for certificate service
-                session.execute(text("""
-                    INSERT INTO certificate_submissions (
-                        user_id, job_name, preferred_date, cert_type,
-                        carne_identidad, contrasena, tomo, pagina, visado_mark
-                    ) VALUES (
-                        :user_id, :job_name, :preferred_date, :cert_type,
-                        :carne_identidad, :contrasena, :tomo, :pagina, :visado_mark
-                    )
-                """), {
-                    "user_id": user_id,
-                    "job_name": job_name,
-                    "preferred_date": form_data.get("preferred_date", ""),
-                    "cert_type": cert_type,
-                    "carne_identidad": form_data.get("carne_identidad", ""),
-                    "contrasena": form_data.get("contrasena", ""),
-                    "tomo": form_data.get("tomo", ""),
-                    "pagina": form_data.get("pagina", ""),
-                    "visado_mark": form_data.get("visado_mark", "x")  # Default to "x" for visado_mark
-                })
-
-            # Update job status and service type
-            session.execute(text("""
-                UPDATE user_jobs
-                SET status = 'active', service_type = :service_type
-                WHERE user_id = :user_id AND job_name = :job_name
-            """), {"user_id": user_id, "job_name": job_name, "service_type": service_type})
-
-            session.commit()
-            logger.info(f"Form submission saved for user {user_id}, job {job_name}")
+        async with get_async_engine().begin() as conn:
+            await _insert_form_submission(conn, user_id, form_data, job_name)
+            logger.info(f"User {user_id} upserted and form submission saved for job {job_name}")
             return True
     except SQLAlchemyError as e:
-        logger.error(f"Error saving form submission: {e}")
+        logger.error(f"Error saving user and form submission: {e}")
         logger.error(f"Traceback: {traceback.format_exc()}")
         return False
 
@@ -121,12 +323,8 @@ async def add_user_job(user_id, job_name, service_type='menores'):
     """Add a new job for a user with pending_form status."""
     try:
         await upsert_user(user_id)
-        with SessionLocal() as session:
-            session.execute(text("""
-                INSERT INTO user_jobs (user_id, job_name, status, service_type)
-                VALUES (:user_id, :job_name, 'pending_form', :service_type)
-            """), {"user_id": user_id, "job_name": job_name, "service_type": service_type})
-            session.commit()
+        async with get_async_engine().begin() as conn:
+            await conn.execute(_INSERT_USER_JOB_SQL, {"user_id": user_id, "job_name": job_name, "service_type": service_type})
             logger.info(f"Job {job_name} added for user {user_id} with pending_form status.")
             return True
     except SQLAlchemyError as e:
@@ -138,11 +336,8 @@ async def add_user_job(user_id, job_name, service_type='menores'):
 async def is_job_ready_to_search(user_id, job_name):
     """Check if a job is ready to start searching (form submitted)."""
     try:
-        with SessionLocal() as session:
-            result = session.execute(text("""
-                SELECT status FROM user_jobs
-                WHERE user_id = :user_id AND job_name = :job_name
-            """), {"user_id": user_id, "job_name": job_name}).fetchone()
+        async with get_async_engine().connect() as conn:
+            result = (await conn.execute(_SELECT_JOB_STATUS_SQL, {"user_id": user_id, "job_name": job_name})).fetchone()
 
             if result:
                 logger.info(f"Job status found: {result[0]}")
@@ -159,14 +354,11 @@ async def is_job_ready_to_search(user_id, job_name):
 async def get_all_active_jobs():
     """Fetch all users with active jobs from the database."""
     try:
-        with SessionLocal() as session:
-            results = session.execute(text("""
-                SELECT user_id, job_name FROM user_jobs
-                WHERE status = 'active'
-            """)).fetchall()
+        async with get_async_engine().connect() as conn:
+            results = (await conn.execute(_SELECT_ACTIVE_JOBS_SQL)).fetchall()
 
             logger.info(f"Active jobs retrieved from database: {results}")
-            return [{"user_id": row[0], "job_name": row[1]} for row in results]
+            return [{"user_id": row[0], "job_name": row[1], "service_type": row[2]} for row in results]
     except SQLAlchemyError as e:
         logger.error(f"Error retrieving active jobs: {e}")
         logger.error(f"Traceback: {traceback.format_exc()}")
@@ -176,73 +368,45 @@ async def get_all_active_jobs():
 async def remove_user_job(user_id, job_name):
     """Remove a job for a user and associated form submissions."""
     try:
-        with SessionLocal() as session:
+        async with get_async_engine().begin() as conn:
             # First get the service type
-            service_type_result = session.execute(text("""
-                SELECT service_type FROM user_jobs
-                WHERE user_id = :user_id AND job_name = :job_name
-                LIMIT 1
-            """), {"user_id": user_id, "job_name": job_name}).fetchone()
+            service_type_result = (await conn.execute(_SELECT_SERVICE_TYPE_SQL, {"user_id": user_id, "job_name": job_name})).fetchone()
 
             if service_type_result:
                 service_type = service_type_result[0]
 
                 # Delete from appropriate submissions table
                 if service_type == "menores":
-                    session.execute(text("""
-                        DELETE FROM menores_submissions 
-                        WHERE user_id = :user_id AND job_name = :job_name
-                    """), {"user_id": user_id, "job_name": job_name})
+                    await conn.execute(_DELETE_MENORES_SQL, {"user_id": user_id, "job_name": job_name})
                 else:
-                    session.execute(text("""
-                        DELETE FROM certificate_submissions 
-                        WHERE user_id = :user_id AND job_name = :job_name
-                    """), {"user_id": user_id, "job_name": job_name})
+                    await conn.execute(_DELETE_CERTIFICATE_SQL, {"user_id": user_id, "job_name": job_name})
 
             # Delete the job
-            session.execute(text("""
-                DELETE FROM user_jobs 
-                WHERE user_id = :user_id AND job_name = :job_name
-            """), {"user_id": user_id, "job_name": job_name})
+            await conn.execute(_DELETE_USER_JOB_SQL, {"user_id": user_id, "job_name": job_name})
 
-            session.commit()
             logger.info(f"Job {job_name} and related submissions removed for user {user_id}.")
     except SQLAlchemyError as e:
         logger.error(f"Error removing user job: {e}")
         logger.error(f"Traceback: {traceback.format_exc()}")
 
 
-async def get_preferred_date(user_id, job_name):
-    """Get the preferred date for a job."""
+async def remove_all_user_jobs(user_id):
+    """Remove all of a user's jobs and their form submissions."""
     try:
-        with SessionLocal() as session:
-            # First get the service type
-            service_type_result = session.execute(text("""
-                SELECT service_type FROM user_jobs
-                WHERE user_id = :user_id AND job_name = :job_name
-                LIMIT 1
-            """), {"user_id": user_id, "job_name": job_name}).fetchone()
+        async with get_async_engine().begin() as conn:
+            await conn.execute(_DELETE_ALL_USER_JOBS_SQL, {"user_id": user_id})
 
-            if not service_type_result:
-                return None
+            logger.info(f"All jobs and related submissions removed for user {user_id}.")
+    except SQLAlchemyError as e:
+        logger.error(f"Error removing all user jobs: {e}")
+        logger.error(f"Traceback: {traceback.format_exc()}")
 
-            service_type = service_type_result[0]
 
-            # Query the appropriate table
-            if service_type == "menores":
-                result = session.execute(text("""
-                    SELECT preferred_date FROM menores_submissions
-                    WHERE user_id = :user_id AND job_name = :job_name
-                    ORDER BY submitted_at DESC
-                    LIMIT 1
-                """), {"user_id": user_id, "job_name": job_name}).fetchone()
-            else:
-                result = session.execute(text("""
-                    SELECT preferred_date FROM certificate_submissions
-                    WHERE user_id = :user_id AND job_name = :job_name
-                    ORDER BY submitted_at DESC
-                    LIMIT 1
-                """), {"user_id": user_id, "job_name": job_name}).fetchone()
+async def get_preferred_date(user_id, job_name):
+    """Get the preferred date for a job."""
+    try:
+        async with get_async_engine().connect() as conn:
+            result = (await conn.execute(_SELECT_PREFERRED_DATE_SQL, {"user_id": user_id, "job_name": job_name})).fetchone()
 
             if result and result[0]:
                 return result[0]
@@ -255,10 +419,8 @@ async def get_preferred_date(user_id, job_name):
 async def get_user_jobs(user_id):
     """Get all jobs for a user."""
     try:
-        with SessionLocal() as session:
-            results = session.execute(text("""
-                SELECT job_name FROM user_jobs WHERE user_id = :user_id
-            """), {"user_id": user_id}).fetchall()
+        async with get_async_engine().connect() as conn:
+            results = (await conn.execute(_SELECT_USER_JOBS_SQL, {"user_id": user_id})).fetchall()
             return [row[0] for row in results]
     except SQLAlchemyError as e:
         logger.error(f"Error getting user jobs: {e}")
@@ -266,16 +428,29 @@ async def get_user_jobs(user_id):
         return []
 
 
+async def check_job_name(user_id, job_name):
+    """
+    Return (job_count, name_taken) for a user: how many jobs they have and
+    whether job_name is already used by one of them, ignoring case.
+    """
+    try:
+        async with get_async_engine().connect() as conn:
+            job_count, name_taken = (await conn.execute(
+                _SELECT_JOB_NAME_CHECK_SQL, {"user_id": user_id, "job_name": job_name}
+            )).one()
+            return job_count, name_taken
+    except SQLAlchemyError as e:
+        logger.error(f"Error checking job name: {e}")
+        logger.error(f"Traceback: {traceback.format_exc()}")
+        return 0, False
+
+
 async def update_preferred_date(user_id, job_name, preferred_date):
     """Update preferred date for an existing job."""
     try:
-        with SessionLocal() as session:
+        async with get_async_engine().begin() as conn:
             # First get the service type
-            service_type_result = session.execute(text("""
-                SELECT service_type FROM user_jobs
-                WHERE user_id = :user_id AND job_name = :job_name
-                LIMIT 1
-            """), {"user_id": user_id, "job_name": job_name}).fetchone()
+            service_type_result = (await conn.execute(_SELECT_SERVICE_TYPE_SQL, {"user_id": user_id, "job_name": job_name})).fetchone()
 
             if not service_type_result:
                 return False
@@ -284,40 +459,21 @@ async def update_preferred_date(user_id, job_name, preferred_date):
 
             if service_type == "menores":
                 # Check if the job already has a form submission
-                existing = session.execute(text("""
-                    SELECT id FROM menores_submissions
-                    WHERE user_id = :user_id AND job_name = :job_name
-                    LIMIT 1
-                """), {"user_id": user_id, "job_name": job_name}).fetchone()
+                existing = (await conn.execute(_SELECT_MENORES_ID_SQL, {"user_id": user_id, "job_name": job_name})).fetchone()
 
                 if existing:
                     # Update existing record
-                    session.execute(text("""
-                        UPDATE menores_submissions
-                        SET preferred_date = :preferred_date
-                        WHERE user_id = :user_id AND job_name = :job_name
-                    """), {"user_id": user_id, "job_name": job_name, "preferred_date": preferred_date})
+                    await conn.execute(_UPDATE_MENORES_PREFERRED_DATE_SQL, {"user_id": user_id, "job_name": job_name, "preferred_date": preferred_date})
                 else:
                     # Create a minimal record
-                    session.execute(text("""
-                        INSERT INTO menores_submissions (user_id, job_name, preferred_date)
-                        VALUES (:user_id, :job_name, :preferred_date)
-                    """), {"user_id": user_id, "job_name": job_name, "preferred_date": preferred_date})
+                    await conn.execute(_INSERT_MENORES_PREFERRED_DATE_SQL, {"user_id": user_id, "job_name": job_name, "preferred_date": preferred_date})
             else:
                 # Check if the job already has a form submission
-                existing = session.execute(text("""
-                    SELECT id FROM certificate_submissions
-                    WHERE user_id = :user_id AND job_name = :job_name
-                    LIMIT 1
-                """), {"user_id": user_id, "job_name": job_name}).fetchone()
+                existing = (await conn.execute(_SELECT_CERTIFICATE_ID_SQL, {"user_id": user_id, "job_name": job_name})).fetchone()
 
                 if existing:
                     # Update existing record
-                    session.execute(text("""
-                        UPDATE certificate_submissions
-                        SET preferred_date = :preferred_date
-                        WHERE user_id = :user_id AND job_name = :job_name
-                    """), {"user_id": user_id, "job_name": job_name, "preferred_date": preferred_date})
+                    await conn.execute(_UPDATE_CERTIFICATE_PREFERRED_DATE_SQL, {"user_id": user_id, "job_name": job_name, "preferred_date": preferred_date})
                 else:
                     # Determine cert type
                     cert_type = "nacimiento"
@@ -325,13 +481,8 @@ async def update_preferred_date(user_id, job_name, preferred_date):
                         cert_type = "dni"
 
                     # Create a minimal record
-                    session.execute(text("""
-                        INSERT INTO certificate_submissions (user_id, job_name, preferred_date, cert_type)
-                        VALUES (:user_id, :job_name, :preferred_date, :cert_type)
-                    """), {"user_id": user_id, "job_name": job_name, "preferred_date": preferred_date,
-                           "cert_type": cert_type})
+                    await conn.execute(_INSERT_CERTIFICATE_PREFERRED_DATE_SQL, {"user_id": user_id, "job_name": job_name, "preferred_date": preferred_date, "cert_type": cert_type})
 
-            session.commit()
             logger.info(f"Updated preferred date for user {user_id}, job {job_name}")
             return True
     except SQLAlchemyError as e:
@@ -1,119 +1,221 @@
-from sqlalchemy import create_engine, text
-from sqlalchemy.orm import sessionmaker, scoped_session
-from sqlalchemy.pool import QueuePool
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from sqlalchemy.pool import NullPool, QueuePool
+from functools import lru_cache
 import os
 import logging
-import traceback
 
 logger = logging.getLogger(__name__)
 
-# Get database URL from environment with validation
-DATABASE_URL = os.environ.get('DATABASE_URL', '')
-if not DATABASE_URL:
-    logger.error("DATABASE_URL is not set. Please set it in your environment variables.")
-    raise ValueError("DATABASE_URL must be provided")
-
-# Ensure proper PostgreSQL connection string
-if DATABASE_URL.startswith('postgres://'):
-    DATABASE_URL = DATABASE_URL.replace('postgres://', 'postgresql://', 1)
-
-# Add SSL mode and connection pooling parameters
-if '?' not in DATABASE_URL:
-    DATABASE_URL += '?sslmode=require'
-
-try:
-    # Enhanced connection pooling and error handling
-    engine = create_engine(
-        DATABASE_URL,
-        poolclass=QueuePool,
-        pool_pre_ping=True,  # Test connections before using
-        pool_size=10,        # Number of connections to keep open
-        max_overflow=20,     # Additional connections if pool is full
-        pool_timeout=30,     # Wait time for getting a connection
-        pool_recycle=1800,   # Recycle connections after 30 minutes
-    )
-    
-    # Create thread-local session factory
-    SessionLocal = scoped_session(sessionmaker(bind=engine))
-except Exception as e:
-    logger.error(f"Database connection error: {e}")
-    logger.error(f"DATABASE_URL: {DATABASE_URL}")
-    logger.error(f"Traceback: {traceback.format_exc()}")
-    raise
+def _normalize_url(url):
+    """Turn a Heroku-style postgres:// URL into one SQLAlchemy accepts."""
+    # Ensure proper PostgreSQL connection string
+    if url.startswith('postgres://'):
+        url = url.replace('postgres://', 'postgresql://', 1)
 
+    # Add SSL mode and connection pooling parameters
+    if '?' not in url:
+        url += '?sslmode=require'
+    return url
 
-def init_db():
-    """Optimized table creation with error handling and indexing."""
+
+def _asyncpg_url(url):
+    """Rewrite a libpq-style URL for the asyncpg driver."""
+    async_url = make_url(url).set(drivername='postgresql+asyncpg')
+    if 'sslmode' in async_url.query:
+        # asyncpg takes the libpq sslmode value under the name "ssl"
+        async_url = async_url.difference_update_query(['sslmode']).update_query_dict(
+            {'ssl': async_url.query['sslmode']}
+        )
+    return async_url
+
+
+@lru_cache(maxsize=1)
+def get_database_url():
+    """DATABASE_URL from the environment, validated on first use."""
+    # Get database URL from environment with validation
+    url = os.environ.get('DATABASE_URL', '')
+    if not url:
+        logger.error("DATABASE_URL is not set. Please set it in your environment variables.")
+        raise ValueError("DATABASE_URL must be provided")
+    return _normalize_url(url)
+
+
+@lru_cache(maxsize=1)
+def get_pgbouncer_url():
+    """
+    Optional PgBouncer (transaction pooling) in front of Postgres, or '' if
+    unset. When set, the application's queries go through it and it owns the
+    server backends, so the local pools stay tiny. A Unix-socket URL
+    (postgresql:///db?host=/var/run/postgresql) also works here for a
+    co-located server and skips TLS altogether.
+    """
+    url = os.environ.get('PGBOUNCER_URL', '')
+    return _normalize_url(url) if url else ''
+
+
+# libpq TCP keepalives: a connection the server or a middlebox dropped is
+# noticed while it sits idle in the pool, not when a query hits it
+_KEEPALIVE_ARGS = {
+    'keepalives': 1,
+    'keepalives_idle': 30,
+    'keepalives_interval': 10,
+    'keepalives_count': 3,
+}
+
+
+def _invalidate_on_disconnect(context):
+    """
+    handle_error hook: treat an OperationalError without a server SQLSTATE
+    (the connection itself failed, not the statement) as a disconnect, so
+    the pool drops its stale connections and the next checkout reconnects.
+    """
+    if (isinstance(context.sqlalchemy_exception, OperationalError)
+            and getattr(context.original_exception, 'pgcode', None) is None):
+        context.is_disconnect = True
+
+
+# Engines are built on first use so importing this module (alembic, tooling,
+# processes that never query) costs nothing and needs no DATABASE_URL
+
+@lru_cache(maxsize=1)
+def get_engine():
+    """Shared sync engine."""
+    try:
+        pgbouncer_url = get_pgbouncer_url()
+        if pgbouncer_url:
+            # PgBouncer rejects unknown startup parameters, so JIT has to be
+            # turned off on the server side (ALTER ROLE ... SET jit = off)
+            pool = {'pool_size': 2, 'max_overflow': 0}
+            connect_args = {'connect_timeout': 5, **_KEEPALIVE_ARGS}
+        else:
+            # The bot's load is bursty, so keep few permanent connections,
+            # allow a large overflow and hand out the most recently used
+            # connection first so idle ones age out
+            pool = {
+                'pool_size': int(os.environ.get('DB_POOL_SIZE', 3)),          # Connections kept open
+                'max_overflow': int(os.environ.get('DB_MAX_OVERFLOW', 40)),   # Extra connections under load
+            }
+            # The queries here are short OLTP lookups, which never recoup
+            # JIT compilation time
+            connect_args = {
+                'connect_timeout': 5,
+                'application_name': 'tgbot',
+                'options': '-c jit=off',
+                **_KEEPALIVE_ARGS,
+            }
+
+        # Enhanced connection pooling and error handling. No pre-ping round
+        # trip on checkout: stale connections are bounded by pool_recycle and
+        # the keepalives, and a disconnect that slips through invalidates the
+        # pool via the handle_error hook
+        sync_engine = create_engine(
+            pgbouncer_url or get_database_url(),
+            poolclass=QueuePool,
+            pool_timeout=int(os.environ.get('DB_POOL_TIMEOUT', 10)),   # Wait time for getting a connection
+            pool_recycle=int(os.environ.get('DB_POOL_RECYCLE', 600)),  # Recycle connections after 10 minutes
+            pool_use_lifo=True,
+            query_cache_size=1200,  # Compiled statements kept per engine
+            connect_args=connect_args,
+            **pool,
+        )
+        event.listen(sync_engine, 'handle_error', _invalidate_on_disconnect)
+        return sync_engine
+    except Exception:
+        logger.exception("Database connection error")
+        raise
+
+
+@lru_cache(maxsize=1)
+def get_async_engine():
+    """
+    Persistent asyncpg-backed pool for the coroutine-based helpers, so each
+    call checks out a warm connection instead of reconnecting.
+    """
     try:
-        with engine.begin() as conn:
-            # Users table with additional indexing
-            conn.execute(text("""
-                CREATE TABLE IF NOT EXISTS users (
-                    id SERIAL PRIMARY KEY,
-                    user_id BIGINT UNIQUE NOT NULL,
-                    last_interaction TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                );
-                CREATE INDEX IF NOT EXISTS idx_users_user_id ON users(user_id);
-            """))
-
-            # User jobs table with performance optimization
-            conn.execute(text("""
-                CREATE TABLE IF NOT EXISTS user_jobs (
-                    id SERIAL PRIMARY KEY,
-                    user_id BIGINT NOT NULL,
-                    job_name TEXT NOT NULL,
-                    status TEXT DEFAULT 'pending_form',
-                    service_type TEXT NOT NULL,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    FOREIGN KEY(user_id) REFERENCES users(user_id),
-                    UNIQUE(user_id, job_name)
-                );
-                CREATE INDEX IF NOT EXISTS idx_user_jobs_user_id ON user_jobs(user_id);
-                CREATE INDEX IF NOT EXISTS idx_user_jobs_status ON user_jobs(status);
-            """))
-
-            # Table for menores service submissions
-            conn.execute(text("""
-                CREATE TABLE IF NOT EXISTS menores_submissions (
-                    id SERIAL PRIMARY KEY,
-                    user_id BIGINT NOT NULL,
-                    job_name TEXT NOT NULL,
-                    volume_page_number TEXT,
-                    password TEXT,
-                    child1_identifier TEXT,
-                    child1_name TEXT,
-                    child1_birth_date TEXT,
-                    child2_identifier TEXT,
-                    child2_name TEXT,
-                    child2_birth_date TEXT,
-                    child3_identifier TEXT,
-                    child3_name TEXT,
-                    child3_birth_date TEXT,
-                    preferred_date TEXT,
-                    submitted_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    FOREIGN KEY(user_id) REFERENCES users(user_id)
-                );
-            """))
-
-            # Table for certificate service submissions
-            conn.execute(text("""
-                CREATE TABLE IF NOT EXISTS certificate_submissions (
-                    id SERIAL PRIMARY KEY,
-                    user_id BIGINT NOT NULL,
-                    job_name TEXT NOT NULL,
-                    carne_identidad TEXT,
-                    contrasena TEXT,
-                    tomo TEXT,
-                    pagina TEXT,
-                    visado_mark TEXT DEFAULT 'x',
-                    preferred_date TEXT,
-                    cert_type TEXT,  -- 'nacimiento' or 'dni'
-                    submitted_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    FOREIGN KEY(user_id) REFERENCES users(user_id)
-                );
-            """))
-
-        logger.info("Database tables created with optimized indexing.")
-    except Exception as e:
-        logger.error(f"Error initializing database: {e}")
-        logger.error(f"Traceback: {traceback.format_exc()}")
+        pgbouncer_url = get_pgbouncer_url()
+        if pgbouncer_url:
+            pool = {'pool_size': 2, 'max_overflow': 0}
+            # Transaction pooling may hand each transaction a different
+            # backend, so statements prepared on one cannot be reused
+            connect_args = {
+                'prepared_statement_cache_size': 0,
+                'statement_cache_size': 0,
+            }
+        else:
+            # This pool serves the bot's per-minute job checks and the
+            # backend's requests, so it is sized separately from the sync one
+            pool = {
+                'pool_size': int(os.environ.get('DB_ASYNC_POOL_SIZE', 10)),
+                'max_overflow': int(os.environ.get('DB_ASYNC_MAX_OVERFLOW', 20)),
+            }
+            connect_args = {
+                # SQLAlchemy prepares each statement itself and keeps the
+                # handles in its own per-connection LRU; asyncpg's cache
+                # covers the rest. Sized well above the number of distinct
+                # statements so the hot ones are never evicted and re-prepared
+                'prepared_statement_cache_size': 1024,
+                'statement_cache_size': 1024,
+                'server_settings': {'application_name': 'tgbot', 'jit': 'off'},
+            }
+
+        # Same checkout policy as the sync engine; asyncpg takes no libpq
+        # keepalive options, so the shorter recycle does that job here
+        async_engine = create_async_engine(
+            _asyncpg_url(pgbouncer_url or get_database_url()),
+            pool_timeout=30,
+            pool_recycle=600,
+            connect_args=connect_args,
+            **pool,
+        )
+        event.listen(async_engine.sync_engine, 'handle_error', _invalidate_on_disconnect)
+        return async_engine
+    except Exception:
+        logger.exception("Database connection error")
+        raise
+
+
+@lru_cache(maxsize=1)
+def get_listen_engine():
+    """
+    Engine for LISTEN connections. LISTEN needs a session-level connection,
+    which transaction pooling cannot give, so behind PgBouncer it connects
+    to Postgres directly.
+    """
+    if not get_pgbouncer_url():
+        return get_async_engine()
+    return create_async_engine(_asyncpg_url(get_database_url()), poolclass=NullPool)
+
+
+@lru_cache(maxsize=1)
+def _async_session_factory():
+    return async_sessionmaker(get_async_engine(), expire_on_commit=False)
+
+
+def get_async_session():
+    """
+    New AsyncSession for the bot helpers so their queries await the driver
+    instead of blocking the event loop.
+    """
+    return _async_session_factory()()
+
+
+# Built once at import and reused on every start-up check
+_SCHEMA_CHECK_SQL = text(
+    "SELECT 1 FROM information_schema.tables WHERE table_name = 'users' LIMIT 1"
+)
+
+
+def init_db():
+    """Check that the schema is in place.
+
+    The tables are created by the Alembic migrations (`alembic upgrade head`,
+    run once per deploy), so starting a worker only costs this lookup.
+    """
+    with get_engine().connect() as conn:
+        found = conn.execute(_SCHEMA_CHECK_SQL).scalar()
+    if not found:
+        raise RuntimeError("Database schema is missing; run `alembic upgrade head` first.")
+    logger.info("Database schema is in place.")
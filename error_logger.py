@@ -1,8 +1,17 @@
 import logging
 import traceback
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import os
-from datetime import datetime
+import sys
+import orjson
+import queue
+import threading
+import time
+from collections import Counter
+from cachetools import TTLCache
+from functools import lru_cache
 
 logger = logging.getLogger(__name__)
 
@@ -10,91 +19,209 @@ logger = logging.getLogger(__name__)
 ERROR_BOT_TOKEN = os.environ.get('ERROR_BOT_TOKEN')
 ERROR_CHAT_ID = os.environ.get('ERROR_CHAT_ID')
 
-def log_error(user_id, error_message, job_name=None, additional_info=None):
+@lru_cache(maxsize=8)
+def _send_url(bot_token):
+    """sendMessage endpoint for a bot token, built once per token."""
+    return f"https://api.telegram.org/bot{bot_token}/sendMessage"
+
+_ERROR_URL = _send_url(ERROR_BOT_TOKEN) if ERROR_BOT_TOKEN else None
+
+# Generic user-facing messages keyed by service type, JSON-encoded once so
+# each send only has to splice in the chat id
+_FRIENDLY_MESSAGES = {
+    "menores": "I'm having trouble checking appointment availability for Menores Ley 36 right now. Please try again later.",
+    "certificate": "I'm having trouble checking certificate appointment availability right now. Please try again later.",
+    None: "I encountered a temporary issue while processing your request. Please try again later.",
+}
+_FRIENDLY_MESSAGES_JSON = {key: orjson.dumps(text) for key, text in _FRIENDLY_MESSAGES.items()}
+_JSON_HEADERS = {"Content-Type": "application/json"}
+
+# Fixed first line of every monitoring-bot report
+_REPORT_HEADER = "🚨 *ERROR REPORT* 🚨\n"
+
+# Byte budget for a whole report (Telegram rejects messages over 4096
+# characters) and the bytes taken by the stack trace's surrounding markup
+_MAX_REPORT_BYTES = 4000
+_TRACE_FRAME_BYTES = len("📊 *Stack Trace*:\n```\n\n```".encode())
+_TRUNCATED_MARK = "...[truncated]"
+
+# Frames formatted per stack trace, counted from where the exception was
+# raised; anything further out is cut by the byte budget anyway
+_TRACE_FRAME_LIMIT = 20
+
+# Shared keep-alive session for Telegram calls so repeated sends reuse the
+# same TLS connection instead of handshaking on every request. Only the two
+# sender threads below post through it, so two connections are enough
+TG_SESSION = requests.Session()
+TG_SESSION.mount("https://", HTTPAdapter(
+    pool_connections=4,
+    pool_maxsize=2,
+    max_retries=Retry(
+        total=3,
+        backoff_factor=0.2,
+        status_forcelist=(429, 502, 503, 504),
+        allowed_methods=frozenset({"POST"}),
+        respect_retry_after_header=True,
+    ),
+))
+
+# Reports are handed to a background sender so callers never wait on
+# Telegram; when the queue is full new reports are dropped. Messages to
+# users have their own unbounded queue and sender, so they are never
+# dropped and never wait behind a burst of reports
+_REPORT_QUEUE = queue.Queue(maxsize=512)
+_USER_MESSAGE_QUEUE = queue.Queue()
+
+def _drain(send_queue):
+    """Send a queue's messages one at a time for the life of the process."""
+    while True:
+        session, url, description, kwargs = send_queue.get()
+        try:
+            response = session.post(url, timeout=10, **kwargs)
+            response.raise_for_status()
+        except Exception as e:
+            logger.error(f"Failed to send {description}: {e}")
+
+threading.Thread(target=_drain, args=(_REPORT_QUEUE,), name="error-reporter", daemon=True).start()
+threading.Thread(target=_drain, args=(_USER_MESSAGE_QUEUE,), name="user-notifier", daemon=True).start()
+
+def _enqueue_report(session, url, description, **kwargs):
+    """Queue a Telegram POST for the background sender; returns False if dropped."""
+    try:
+        _REPORT_QUEUE.put_nowait((session, url, description, kwargs))
+        return True
+    except queue.Full:
+        logger.warning(f"Error report queue full, dropping {description}")
+        return False
+
+def _enqueue_monitoring_report(message, session):
+    """Queue a Markdown report for the monitoring chat."""
+    return _enqueue_report(
+        session,
+        _ERROR_URL,
+        "error to monitoring bot",
+        data=orjson.dumps({
+            "chat_id": ERROR_CHAT_ID,
+            "text": message,
+            "parse_mode": "Markdown"
+        }),
+        headers=_JSON_HEADERS
+    )
+
+# Identical errors (same message, job and user) are reported once per
+# window; repeats are only counted and summed up when the window closes,
+# so an outage produces one report per distinct error instead of thousands
+_DEDUP_WINDOW = 60
+_recent_errors = TTLCache(maxsize=256, ttl=_DEDUP_WINDOW)
+_repeat_counts = Counter()
+_dedup_lock = threading.Lock()
+
+def _flush_repeats():
+    """Report how often each deduplicated error recurred, once per window."""
+    global _repeat_counts
+    while True:
+        time.sleep(_DEDUP_WINDOW)
+        with _dedup_lock:
+            counts, _repeat_counts = _repeat_counts, Counter()
+        for (error_message, job_name, user_id), count in counts.items():
+            parts = [_REPORT_HEADER, f"👤 *User ID*: `{user_id}`\n"]
+            if job_name:
+                parts.append(f"🔧 *Job*: `{job_name}`\n")
+            parts.append(f"❌ *Error*: `{error_message}`\n\n")
+            parts.append(f"🔁 Seen {count}× more in the last {_DEDUP_WINDOW}s")
+            _enqueue_monitoring_report("".join(parts), TG_SESSION)
+
+threading.Thread(target=_flush_repeats, name="error-dedup", daemon=True).start()
+
+def log_error(user_id, error_message, job_name=None, additional_info=None, *, session=TG_SESSION):
     """
     Log error to a monitoring bot instead of sending to the user.
+    The report is built here, so the current traceback is captured, and
+    sent in the background.
     
     Args:
         user_id (str): The ID of the user who experienced the error
         error_message (str): Brief error description
         job_name (str, optional): The job name where the error occurred
         additional_info (dict, optional): Any additional context for debugging
+        session (requests.Session, optional): Session to send the report over
     """
     if not ERROR_BOT_TOKEN or not ERROR_CHAT_ID:
         logger.warning("ERROR_BOT_TOKEN or ERROR_CHAT_ID not set. Error monitoring is disabled.")
         return False
+
+    # Count repeats of an error already reported in this window
+    key = (error_message, job_name, user_id)
+    with _dedup_lock:
+        if key in _recent_errors:
+            _repeat_counts[key] += 1
+            return True
+        _recent_errors[key] = True
     
     try:
         # Format current time
-        current_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        current_time = time.strftime("%Y-%m-%d %H:%M:%S")
         
-        # Get traceback information
-        stack_trace = traceback.format_exc()
-        if stack_trace == "NoneType: None\n":
+        # Get traceback information, only formatting one if an exception is
+        # active, and only its innermost frames
+        exc_info = sys.exc_info()
+        if exc_info[0] is None:
             stack_trace = "No traceback available"
+        else:
+            stack_trace = "".join(traceback.format_exception(*exc_info, limit=-_TRACE_FRAME_LIMIT))
             
         # Construct message
-        message = f"🚨 *ERROR REPORT* 🚨\n"
-        message += f"👤 *User ID*: `{user_id}`\n"
+        parts = [_REPORT_HEADER, f"👤 *User ID*: `{user_id}`\n"]
         if job_name:
-            message += f"🔧 *Job*: `{job_name}`\n"
-        message += f"⏰ *Time*: `{current_time}`\n"
-        message += f"❌ *Error*: `{error_message}`\n\n"
+            parts.append(f"🔧 *Job*: `{job_name}`\n")
+        parts.append(f"⏰ *Time*: `{current_time}`\n❌ *Error*: `{error_message}`\n\n")
         
         # Add additional info if provided
         if additional_info:
-            message += "📋 *Additional Info*:\n"
-            for key, value in additional_info.items():
-                message += f"- {key}: {value}\n"
-            message += "\n"
+            parts.append("📋 *Additional Info*:\n")
+            parts.append("".join(f"- {key}: {value}\n" for key, value in additional_info.items()))
+            parts.append("\n")
             
-        # Add stack trace (truncate if too long to fit in Telegram message)
-        max_trace_length = 3500  # Telegram has ~4000 char limit for messages
-        if len(stack_trace) > max_trace_length:
-            stack_trace = stack_trace[:max_trace_length] + "...[truncated]"
+        # Add stack trace, truncated to whatever room the rest of the report
+        # leaves. Measured in UTF-8 bytes so emoji and non-ASCII text in the
+        # error cannot push the message over Telegram's limit
+        head = "".join(parts)
+        budget = _MAX_REPORT_BYTES - len(head.encode()) - _TRACE_FRAME_BYTES
+        trace_bytes = stack_trace.encode()
+        if len(trace_bytes) > budget:
+            keep = max(budget - len(_TRUNCATED_MARK), 0)
+            stack_trace = trace_bytes[:keep].decode(errors="ignore") + _TRUNCATED_MARK
             
-        message += f"📊 *Stack Trace*:\n```\n{stack_trace}\n```"
+        message = f"{head}📊 *Stack Trace*:\n```\n{stack_trace}\n```"
         
         # Send to error monitoring bot
-        response = requests.post(
-            f"https://api.telegram.org/bot{ERROR_BOT_TOKEN}/sendMessage",
-            json={
-                "chat_id": ERROR_CHAT_ID,
-                "text": message,
-                "parse_mode": "Markdown"
-            },
-            timeout=10
-        )
-        response.raise_for_status()
-        return True
+        return _enqueue_monitoring_report(message, session)
     except Exception as e:
-        logger.error(f"Failed to send error to monitoring bot: {e}")
-        logger.error(traceback.format_exc())
+        logger.error(f"Failed to report error to monitoring bot: {e}")
         return False
 
-def send_user_friendly_message(bot_token, chat_id, service_type=None):
+def send_user_friendly_message(bot_token, chat_id, service_type=None, *, session=TG_SESSION):
     """
     Send a generic user-friendly error message without exposing error details.
+    The message is sent in the background.
     
     Args:
         bot_token (str): The Telegram bot token
         chat_id (str/int): The chat ID to send message to
         service_type (str, optional): Type of service for more specific messaging
+        session (requests.Session, optional): Session to send the message over
     """
     try:
-        # Create a generic message based on service type
-        if service_type == "menores":
-            message = "I'm having trouble checking appointment availability for Menores Ley 36 right now. Please try again later."
-        elif service_type == "certificate":
-            message = "I'm having trouble checking certificate appointment availability right now. Please try again later."
-        else:
-            message = "I encountered a temporary issue while processing your request. Please try again later."
-        
+        # Pick the pre-encoded generic message for this service type
+        message = _FRIENDLY_MESSAGES_JSON.get(service_type, _FRIENDLY_MESSAGES_JSON[None])
+        body = b'{"chat_id":' + orjson.dumps(chat_id) + b',"text":' + message + b'}'
+
         # Send message to user
-        requests.post(
-            f"https://api.telegram.org/bot{bot_token}/sendMessage",
-            json={"chat_id": chat_id, "text": message},
-            timeout=10
-        )
+        _USER_MESSAGE_QUEUE.put_nowait((
+            session,
+            _send_url(bot_token),
+            "user-friendly message",
+            {"data": body, "headers": _JSON_HEADERS}
+        ))
     except Exception as e:
-        logger.error(f"Failed to send user-friendly message: {e}")
\ No newline at end of file
+        logger.error(f"Failed to send user-friendly message: {e}")
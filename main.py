@@ -4,16 +4,21 @@ import re
 import subprocess
 import traceback
 import asyncio
-from sqlalchemy import text
+import collections
+import functools
+import time
+from urllib.parse import urlencode
+from sqlalchemy import bindparam, text
 from flask import Flask, request, jsonify
-from telegram import Update, ReplyKeyboardMarkup, Message, Chat, InlineKeyboardButton, InlineKeyboardMarkup
+from telegram import Update, ReplyKeyboardMarkup, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import Application, CommandHandler, MessageHandler, filters, CallbackContext, CallbackQueryHandler
 from bot_users import (
     upsert_user, add_user_job, remove_user_job, get_user_jobs,
     initialize_db, get_all_active_jobs, is_job_ready_to_search,
-    get_preferred_date, update_preferred_date
+    get_preferred_date, update_preferred_date, listen_for_ready_forms, is_listening,
+    check_job_name, remove_all_user_jobs
 )
-from database import SessionLocal
+from database import get_async_session
 from reacher import check_appointments_async
 from dotenv import load_dotenv
 from error_logger import log_error, send_user_friendly_message
@@ -47,16 +52,228 @@ def get_token():
 # Get GitHub Pages URL from environment variables or use a default
 GITHUB_PAGES_URL = os.environ.get("GITHUB_PAGES_URL", "https://qub1ck.github.io/telegram-bot")
 
-# This will be set during initialization
+# These will be set during initialization
 telegram_app = None
+bot_loop = None
+
+# Fallback sweep for active jobs; new ones normally arrive via form_ready
+NEW_JOBS_CHECK_INTERVAL = int(os.environ.get("NEW_JOBS_CHECK_INTERVAL", 600))
+
+# Seconds between health checks of the form_ready listener. While it is down
+# the bot retries the LISTEN and sweeps for new jobs at this interval instead
+FORM_LISTENER_CHECK_INTERVAL = 60
+
+# Preferred dates are typed as DD/MM/YYYY
+_DATE_RE = re.compile(r'^\d{1,2}/\d{1,2}/\d{4}$')
+
+# Appointment checks run at once for a single "check all" request
+MANUAL_CHECK_CONCURRENCY = 8
+
+# Seconds between "Checked n/total" edits while a "check all" request runs
+CHECK_PROGRESS_INTERVAL = 3
+
+# Set once on_startup has checked the database, so /start need not repeat it
+_DB_READY = asyncio.Event()
+
+# Time limit for a background appointment check, below the 60s job interval
+CHECK_TIMEOUT = 45
+
+# Per-job locks so a slow appointment check is never run twice at once
+_JOB_LOCKS = {}
+
+# Strong references to fire-and-forget tasks so they are not collected mid-run
+_background_tasks = set()
+
+# Service type lookup shared by every job path; built once so SQLAlchemy's
+# compiled-statement cache keys on the same object every time
+_SERVICE_TYPE_STMT = text("""
+    SELECT service_type FROM user_jobs
+    WHERE user_id = :user_id AND job_name = :job_name
+    LIMIT 1
+""")
+
+# Service types of several of a user's jobs at once
+_SERVICE_TYPES_FOR_JOBS_STMT = text("""
+    SELECT job_name, service_type FROM user_jobs
+    WHERE user_id = :user_id AND job_name IN :job_names
+""").bindparams(bindparam("job_names", expanding=True))
+
+# Service type of jobs keyed by (user_id, job_name), filled on demand by
+# _get_service_type. A job's service type never changes, so entries stay
+# until the job is removed
+_SERVICE_TYPE_BY_KEY = {}
+
+# The two possible main menus, built once; the markup objects are immutable
+_KB_NO_JOBS = ReplyKeyboardMarkup(
+    [['Search for new appointments']],
+    one_time_keyboard=False, resize_keyboard=True
+)
+_KB_WITH_JOBS = ReplyKeyboardMarkup(
+    [['Search for new appointments'], ['Cancel search for appointment'], ['Check my appointments']],
+    one_time_keyboard=False, resize_keyboard=True
+)
+
+# Static menus shown by handle_option
+_SEARCH_MENU_MARKUP = ReplyKeyboardMarkup(
+    [
+        ['Reservar Cita de Minores Ley 36'],
+        ['Solicitar certificación de Nacimiento'],
+        ['Solicitar certificación de Nacimiento para DNI'],
+        ['CANCEL']
+    ],
+    one_time_keyboard=True, resize_keyboard=True
+)
+_CHILDREN_MENU_MARKUP = ReplyKeyboardMarkup(
+    [
+        ['INSCRIPCIÓN MENORES LEY36 OPCIÓN 1 HIJO'],
+        ['INSCRIPCIÓN MENORES LEY36 OPCIÓN 2 HIJOS'],
+        ['INSCRIPCIÓN MENORES LEY36 OPCIÓN 3 HIJOS'],
+        ['CANCEL']
+    ],
+    one_time_keyboard=True, resize_keyboard=True
+)
+
+# Registration form buttons: (label, form page prefix); only the URLs are per user
+_REGISTRATION_FORMS = (
+    ("Registration for 1 Child", "first"),
+    ("Registration for 2 Children", "second"),
+    ("Registration for 3 Children", "third"),
+)
+
+# Per-user "has jobs" flag behind the main menu: user_id -> (checked_at, has_jobs).
+# Dropped whenever this process adds or removes one of the user's jobs
+_OPTIONS_CACHE = {}
+_OPTIONS_CACHE_TTL = 5
+
+# A user's job names are also kept in their user_data as
+# '_jobs_cache': (fetched_at, job_names) for menu navigation
+_JOBS_CACHE_TTL = 30
+
+# Recent user-requested check results per site option: option -> (checked_at, dates).
+# Checks for the same option within the TTL, or while one is running, share
+# a single browser run
+_AVAILABILITY_CACHE = {}
+_AVAILABILITY_CACHE_TTL = 30
+_AVAILABILITY_IN_FLIGHT = {}
+
+
+async def _get_service_type(user_id, job_name):
+    """Service type of a job, from the in-process cache or the database; None if there is no such job."""
+    key = (user_id, job_name)
+    service_type = _SERVICE_TYPE_BY_KEY.get(key)
+    if service_type is None:
+        async with get_async_session() as session:
+            row = (await session.execute(
+                _SERVICE_TYPE_STMT, {"user_id": user_id, "job_name": job_name}
+            )).first()
+        if row is None:
+            return None
+        service_type = _SERVICE_TYPE_BY_KEY[key] = row[0]
+    return service_type
+
+
+def _forget_jobs(user_id, job_name=None):
+    """Drop the cached service type and check lock of one removed job, or of all of a user's jobs."""
+    if job_name is not None:
+        _SERVICE_TYPE_BY_KEY.pop((user_id, job_name), None)
+        _JOB_LOCKS.pop((user_id, job_name), None)
+        return
+    for cache in (_SERVICE_TYPE_BY_KEY, _JOB_LOCKS):
+        for key in [key for key in cache if key[0] == user_id]:
+            del cache[key]
+
+
+def _invalidate_user_jobs(user_id):
+    """Forget the cached main menu and job names for a user after their jobs change."""
+    _OPTIONS_CACHE.pop(user_id, None)
+    if telegram_app is not None:
+        user_data = telegram_app.user_data.get(user_id)
+        if user_data:
+            user_data.pop('_jobs_cache', None)
+
+
+async def _cached_user_jobs(context, user_id):
+    """get_user_jobs, served from the user's user_data for up to _JOBS_CACHE_TTL seconds."""
+    cached = context.user_data.get('_jobs_cache')
+    if cached and time.monotonic() - cached[0] < _JOBS_CACHE_TTL:
+        return cached[1]
+    user_jobs = await get_user_jobs(user_id)
+    context.user_data['_jobs_cache'] = (time.monotonic(), user_jobs)
+    return user_jobs
+
+
+async def start_search_task(payload):
+    """Schedule the date checks for a job whose form was just submitted."""
+    user_id = payload["user_id"]
+    job_name = payload["job_name"]
+    try:
+        # Extensive logging for job readiness check
+        logger.debug(f"Checking job readiness for user {user_id}, job {job_name}")
+        job_ready = await is_job_ready_to_search(user_id, job_name)
+
+        logger.debug(f"Job {job_name} ready status: {job_ready}")
+
+        if not job_ready:
+            logger.warning(f"Job {job_name} for user {user_id} is not marked as active")
+            return
+
+        # Extract the original option from the job name
+        # e.g., "Maria, 1 HIJO" -> "INSCRIPCIÓN MENORES LEY36 OPCIÓN 1 HIJO"
+        option_part = job_name.split(", ")[-1]
+        original_option = f"INSCRIPCIÓN MENORES LEY36 OPCIÓN {option_part}"
+
+        logger.debug(f"Original option for {job_name}: {original_option}")
+
+        # Start the background job
+        job_name_to_run = f"check_dates_{user_id}_{job_name}"
+
+        # Check if the job already exists and remove it
+        existing_jobs = telegram_app.job_queue.get_jobs_by_name(job_name_to_run)
+        if existing_jobs:
+            for job in existing_jobs:
+                job.schedule_removal()
+            logger.debug(f"Removed {len(existing_jobs)} existing jobs for {job_name_to_run}")
+
+        # Start new job
+        telegram_app.job_queue.run_repeating(
+            check_dates_continuously,
+            interval=60,
+            first=0,
+            data={'chat_id': user_id, 'user_choice': original_option, 'user_id': user_id, 'job_name': job_name},
+            name=job_name_to_run,
+            job_kwargs={'max_instances': 1}
+        )
+        logger.debug(f"Started background job {job_name_to_run}")
+
+        # Send confirmation message about search starting
+        try:
+            await telegram_app.bot.send_message(
+                chat_id=int(user_id),
+                text=f"Starting automatic search for {job_name}. I'll notify you when appointments become available.",
+                reply_markup=await _build_options_markup(user_id)
+            )
+            logger.debug(f"Sent confirmation message to user {user_id}")
+        except Exception as e:
+            logger.error(f"Error sending Telegram message: {str(e)}")
+            logger.error(f"Traceback: {traceback.format_exc()}")
+
+    except Exception as e:
+        logger.error(f"Error in start_search_task: {str(e)}")
+        logger.error(f"Traceback: {traceback.format_exc()}")
+
+
+def _on_start_search_done(future):
+    """Log a start_search_task that failed outside its own error handling."""
+    if not future.cancelled() and future.exception() is not None:
+        logger.error(f"start_search_task failed: {future.exception()}")
 
 
 @flask_app.route("/start-search", methods=["POST"])
 def start_search():
     """Start a search after form submission."""
     try:
-        # Log raw incoming data for debugging
-        logger.error(f"Start Search Request Received - Raw Data: {request.json}")
+        # Log raw incoming data for debugging; only formatted if debug logging is on
+        logger.debug("Start Search Request Received - Raw Data: %s", request.json)
 
         # Get data from JSON request
         data = request.json
@@ -71,85 +288,21 @@ def start_search():
         # Ensure user_id is an integer
         user_id = int(user_id)
 
-        logger.error(f"Processing start search for user {user_id}, job {job_name}")
+        logger.debug(f"Processing start search for user {user_id}, job {job_name}")
 
-        # Schedule the async function to run
-        async def start_search_task():
-            try:
-                # Extensive logging for job readiness check
-                logger.error(f"Checking job readiness for user {user_id}, job {job_name}")
-                job_ready = await is_job_ready_to_search(user_id, job_name)
-
-                logger.error(f"Job {job_name} ready status: {job_ready}")
-
-                if not job_ready:
-                    logger.error(f"Job {job_name} for user {user_id} is not marked as active")
-                    return jsonify({"status": "error", "message": "Job not ready"}), 400
-
-                # Extract the original option from the job name
-                # e.g., "Maria, 1 HIJO" -> "INSCRIPCIÓN MENORES LEY36 OPCIÓN 1 HIJO"
-                option_part = job_name.split(", ")[-1]
-                original_option = f"INSCRIPCIÓN MENORES LEY36 OPCIÓN {option_part}"
-
-                logger.error(f"Original option for {job_name}: {original_option}")
-
-                # Create a fake update to pass to show_options
-                fake_update = Update(update_id=0,
-                                     message=Message(message_id=0,
-                                                     chat=Chat(id=user_id, type='private'),
-                                                     date=None))
-
-                # Start the background job
-                job_name_to_run = f"check_dates_{user_id}_{job_name}"
-
-                # Check if the job already exists and remove it
-                existing_jobs = telegram_app.job_queue.get_jobs_by_name(job_name_to_run)
-                if existing_jobs:
-                    for job in existing_jobs:
-                        job.schedule_removal()
-                    logger.error(f"Removed {len(existing_jobs)} existing jobs for {job_name_to_run}")
-
-                # Start new job
-                telegram_app.job_queue.run_repeating(
-                    check_dates_continuously,
-                    interval=60,
-                    first=0,
-                    data={'chat_id': user_id, 'user_choice': original_option, 'user_id': user_id, 'job_name': job_name},
-                    name=job_name_to_run,
-                    job_kwargs={'max_instances': 2}
-                )
-                logger.error(f"Started background job {job_name_to_run}")
-
-                # Send confirmation message about search starting
-                try:
-                    await telegram_app.bot.send_message(
-                        chat_id=int(user_id),
-                        text=f"Starting automatic search for {job_name}. I'll notify you when appointments become available.",
-                        reply_markup=await show_options(fake_update, None)
-                    )
-                    logger.error(f"Sent confirmation message to user {user_id}")
-                except Exception as e:
-                    logger.error(f"Error sending Telegram message: {str(e)}")
-                    logger.error(f"Traceback: {traceback.format_exc()}")
-
-                return jsonify({"status": "success", "message": "Search job scheduled"})
-
-            except Exception as e:
-                logger.error(f"Error in start_search_task: {str(e)}")
-                logger.error(f"Traceback: {traceback.format_exc()}")
-                return jsonify({"status": "error", "message": str(e)}), 500
-
-        # Schedule the task to run
+        # Hand the validated request to the bot's event loop; this runs on a
+        # Flask thread, so the coroutine has to be submitted thread-safely
         try:
-            # We need to get the application instance and create the task
-            app_instance = Application.get_instance()
-            if app_instance:
-                app_instance.create_task(start_search_task())
-                logger.error(f"Scheduled start_search_task for user {user_id}, job {job_name}")
-                return jsonify({"status": "success", "message": "Search job scheduled"})
-            else:
-                logger.error("Application.get_instance() returned None")
+            if telegram_app is None or bot_loop is None:
+                logger.error("Telegram app is not running yet")
                 return jsonify({"status": "error", "message": "Could not schedule search task"}), 500
+
+            future = asyncio.run_coroutine_threadsafe(
+                start_search_task({"user_id": user_id, "job_name": job_name}), bot_loop
+            )
+            future.add_done_callback(_on_start_search_done)
+            logger.debug(f"Scheduled start_search_task for user {user_id}, job {job_name}")
+            return jsonify({"status": "success", "message": "Search job scheduled"})
         except Exception as e:
             logger.error(f"Error scheduling start_search_task: {str(e)}")
             logger.error(f"Traceback: {traceback.format_exc()}")
@@ -171,22 +324,25 @@ async def show_options(update: Update, context: CallbackContext):
         logger.error("No message or callback_query found in update.")
         return None
 
-    keyboard = [
-        ['Search for new appointments'],
-    ]  # Default options
+    return await _build_options_markup(user_id)
 
-    user_jobs = await get_user_jobs(user_id)
-    if user_jobs:
-        # If the user has active jobs, show the "Cancel search" and "Check my appointments" buttons
-        keyboard.append(['Cancel search for appointment'])
-        keyboard.append(['Check my appointments'])
 
-    return ReplyKeyboardMarkup(keyboard, one_time_keyboard=False, resize_keyboard=True)
+async def _build_options_markup(user_id):
+    """Main menu for a user: the extra buttons only appear if they have jobs."""
+    cached = _OPTIONS_CACHE.get(user_id)
+    if cached and time.monotonic() - cached[0] < _OPTIONS_CACHE_TTL:
+        has_jobs = cached[1]
+    else:
+        has_jobs = bool(await get_user_jobs(user_id))
+        _OPTIONS_CACHE[user_id] = (time.monotonic(), has_jobs)
+
+    # If the user has active jobs, show the "Cancel search" and "Check my appointments" buttons
+    return _KB_WITH_JOBS if has_jobs else _KB_NO_JOBS
 
 
 async def start(update: Update, context: CallbackContext):
     """Handle the /start command."""
-    await initialize_db()
+    await _DB_READY.wait()
     user_id = update.message.from_user.id
     await upsert_user(user_id)
     await update.message.reply_text("Hello! I'm your appointment bot 🤖!",
@@ -197,22 +353,16 @@ async def send_registration_forms(update: Update, context: CallbackContext):
     """Send a message with registration form links."""
     chat_id = update.message.chat_id  # Get the user's chat ID
 
-    # If there's a pending job name, use it in the URLs
-    job_name = ""
+    # Include the chat_id in the form URLs, and the pending job name if
+    # there is one; the query string is the same for every form
+    params = {'chat_id': chat_id}
     if 'pending_job_name' in context.user_data:
-        job_name = f"&job_name={context.user_data['pending_job_name']}"
-
-    # Include the chat_id in the form URLs
-    form_urls_with_chat_id = {
-        "option1": f"{GITHUB_PAGES_URL}/first_option.html?chat_id={chat_id}{job_name}",
-        "option2": f"{GITHUB_PAGES_URL}/second_option.html?chat_id={chat_id}{job_name}",
-        "option3": f"{GITHUB_PAGES_URL}/third_option.html?chat_id={chat_id}{job_name}",
-    }
+        params['job_name'] = context.user_data['pending_job_name']
+    query_string = urlencode(params)
 
     keyboard = [
-        [InlineKeyboardButton("Registration for 1 Child", url=form_urls_with_chat_id["option1"])],
-        [InlineKeyboardButton("Registration for 2 Children", url=form_urls_with_chat_id["option2"])],
-        [InlineKeyboardButton("Registration for 3 Children", url=form_urls_with_chat_id["option3"])],
+        [InlineKeyboardButton(label, url=f"{GITHUB_PAGES_URL}/{form}_option.html?{query_string}")]
+        for label, form in _REGISTRATION_FORMS
     ]
     reply_markup = InlineKeyboardMarkup(keyboard)
     await update.message.reply_text(
@@ -236,7 +386,7 @@ async def handle_option(update: Update, context: CallbackContext):
         return
 
     if user_choice == "Cancel search for appointment":
-        user_jobs = await get_user_jobs(user_id)
+        user_jobs = await _cached_user_jobs(context, user_id)
         if not user_jobs:
             await update.message.reply_text("No active searches to cancel.",
                                             reply_markup=await show_options(update, context))
@@ -251,7 +401,7 @@ async def handle_option(update: Update, context: CallbackContext):
         return
 
     if user_choice == "Check my appointments":
-        user_jobs = await get_user_jobs(user_id)
+        user_jobs = await _cached_user_jobs(context, user_id)
         if not user_jobs:
             await update.message.reply_text("No active searches to check.",
                                             reply_markup=await show_options(update, context))
@@ -268,26 +418,14 @@ async def handle_option(update: Update, context: CallbackContext):
 
     if user_choice == "Search for new appointments":
         # Show the appointment options
-        options_keyboard = [
-            ['Reservar Cita de Minores Ley 36'],
-            ['Solicitar certificación de Nacimiento'],
-            ['Solicitar certificación de Nacimiento para DNI'],
-            ['CANCEL']
-        ]
-        reply_markup = ReplyKeyboardMarkup(options_keyboard, one_time_keyboard=True, resize_keyboard=True)
-        await update.message.reply_text("Please choose one of the following options:", reply_markup=reply_markup)
+        await update.message.reply_text("Please choose one of the following options:",
+                                        reply_markup=_SEARCH_MENU_MARKUP)
         return
 
     if user_choice == "Reservar Cita de Minores Ley 36":
         # Ask to select number of children options
-        children_options = [
-            ['INSCRIPCIÓN MENORES LEY36 OPCIÓN 1 HIJO'],
-            ['INSCRIPCIÓN MENORES LEY36 OPCIÓN 2 HIJOS'],
-            ['INSCRIPCIÓN MENORES LEY36 OPCIÓN 3 HIJOS'],
-            ['CANCEL']
-        ]
-        reply_markup = ReplyKeyboardMarkup(children_options, one_time_keyboard=True, resize_keyboard=True)
-        await update.message.reply_text("Please select the number of children:", reply_markup=reply_markup)
+        await update.message.reply_text("Please select the number of children:",
+                                        reply_markup=_CHILDREN_MENU_MARKUP)
         return
 
     if user_choice in ["Solicitar certificación de Nacimiento", "Solicitar certificación de Nacimiento para DNI"]:
@@ -334,20 +472,21 @@ async def handle_option(update: Update, context: CallbackContext):
         context.user_data['pending_job_name'] = job_name
 
         # Check if the name is already in use (case-insensitive)
-        user_jobs = await get_user_jobs(user_id)
-        if any(job.lower() == job_name.lower() for job in user_jobs):
+        job_count, name_taken = await check_job_name(user_id, job_name)
+        if name_taken:
             await update.message.reply_text(
                 f"The name '{user_provided_name}' is already in use. Please choose another name.")
             # Stay in the "pending job" state to wait for another name
             return
 
-        if len(user_jobs) >= 15:
+        if job_count >= 15:
             await update.message.reply_text("You have reached the maximum number of active searches (15).",
                                             reply_markup=await show_options(update, context))
             return
 
         # Add the job as pending_form (will be updated to active after form submission)
         job_added = await add_user_job(user_id, job_name, service_type)
+        _invalidate_user_jobs(user_id)
         if not job_added:
             await update.message.reply_text("Failed to create job. Please try again.",
                                             reply_markup=await show_options(update, context))
@@ -359,14 +498,9 @@ async def handle_option(update: Update, context: CallbackContext):
         # Send registration form link
         if form_option:
             chat_id = update.message.chat_id
-            from urllib.parse import quote
             # Properly encode the job name for a URL
-            encoded_job_name = quote(job_name)
-
-            if form_option == "certificate":
-                form_url = f"{GITHUB_PAGES_URL}/certificate_option.html?chat_id={chat_id}&job_name={encoded_job_name}"
-            else:
-                form_url = f"{GITHUB_PAGES_URL}/{form_option}_option.html?chat_id={chat_id}&job_name={encoded_job_name}"
+            query_string = urlencode({'chat_id': chat_id, 'job_name': job_name})
+            form_url = f"{GITHUB_PAGES_URL}/{form_option}_option.html?{query_string}"
 
             keyboard = [[InlineKeyboardButton("Fill Registration Form", url=form_url)]]
             reply_markup = InlineKeyboardMarkup(keyboard)
@@ -416,21 +550,23 @@ async def handle_cancel_job(update: Update, context: CallbackContext):
     try:
         if callback_data == "cancel_all":
             # Cancel all appointments for the user
-            user_jobs = await get_user_jobs(user_id)
-            for job in user_jobs:
-                await remove_user_job(user_id, job)
-                # Remove the background job
-                job_name_to_cancel = f"check_dates_{user_id}_{job}"
-                existing_jobs = context.job_queue.get_jobs_by_name(job_name_to_cancel)
-                if existing_jobs:
-                    for job in existing_jobs:
-                        job.schedule_removal()
+            await remove_all_user_jobs(user_id)
+            _invalidate_user_jobs(user_id)
+            _forget_jobs(user_id)
+
+            # Remove the background jobs in one pass over the queue
+            user_job_prefix = f"check_dates_{user_id}_"
+            for job in context.job_queue.jobs():
+                if job.name and job.name.startswith(user_job_prefix):
+                    job.schedule_removal()
             
             await status_message.edit_text("All appointments have been canceled.")
         else:
             # Cancel a specific appointment
             job_name = callback_data.replace("cancel_", "")
             await remove_user_job(user_id, job_name)
+            _invalidate_user_jobs(user_id)
+            _forget_jobs(user_id, job_name)
             
             # Remove the background job
             job_name_to_cancel = f"check_dates_{user_id}_{job_name}"
@@ -478,22 +614,46 @@ async def handle_cancel_job(update: Update, context: CallbackContext):
         await resume_user_searches(context, user_id, paused_jobs)
         return
 
-    # Create a fake Update object with a valid Message and User
-    fake_message = Message(
-        message_id=0,
-        date=None,
-        chat=Chat(id=query.message.chat_id, type='private'),
-        from_user=query.from_user  # Include the from_user attribute
-    )
-    fake_update = Update(update_id=0, message=fake_message)
-
     # Show options after canceling the job(s)
-    await query.message.reply_text("Please choose an option:", reply_markup=await show_options(fake_update, context))
+    await query.message.reply_text("Please choose an option:", reply_markup=await _build_options_markup(user_id))
     
     # Resume remaining jobs that weren't canceled
     await resume_user_searches(context, user_id, paused_jobs)
 
 
+@functools.lru_cache(maxsize=1024)
+def _classify_job(service_type, job_name):
+    """
+    Form page, site option and description for a job, derived from its name.
+    Memoized, so callers copy the result rather than mutate it.
+    """
+    if service_type == "menores":
+        form_option = None
+        if "1 HIJO" in job_name:
+            form_option = "first"
+        elif "2 HIJOS" in job_name:
+            form_option = "second"
+        elif "3 HIJOS" in job_name:
+            form_option = "third"
+        option_part = job_name.split(", ")[-1]  # Extract "1 HIJO", "2 HIJOS", etc.
+        return {
+            'form_option': form_option,
+            'appointment_option': f"INSCRIPCIÓN MENORES LEY36 OPCIÓN {option_part}",
+            'service_description': "Reservar Cita de Menores Ley 36",
+        }
+
+    # For certificate services
+    if "para DNI" in job_name:
+        option = "Solicitar certificación de Nacimiento para DNI"
+    else:
+        option = "Solicitar certificación de Nacimiento"
+    return {
+        'form_option': "certificate",
+        'appointment_option': option,
+        'service_description': option,
+    }
+
+
 async def check_dates_continuously(context: CallbackContext):
     """Optimized background job for checking appointment dates."""
     job_data = context.job.data
@@ -509,43 +669,33 @@ async def check_dates_continuously(context: CallbackContext):
         if not job_ready:
             logger.info(f"Job {job_name} is no longer active")
             context.job.schedule_removal()
+            _forget_jobs(user_id, job_name)
             return
 
-        # Get service type
-        from sqlalchemy import text as sql_text
-        with SessionLocal() as session:
-            service_type_result = session.execute(sql_text("""
-                SELECT service_type FROM user_jobs
-                WHERE user_id = :user_id AND job_name = :job_name
-                LIMIT 1
-            """), {"user_id": user_id, "job_name": job_name}).fetchone()
-
-            if not service_type_result:
+        # The job's form, site option and description never change, so they
+        # are stored with the job when it is scheduled. Jobs scheduled without
+        # them work them out on their first run from the service type
+        if 'appointment_option' not in job_data:
+            service_type = await _get_service_type(user_id, job_name)
+            if service_type is None:
                 logger.info(f"Job {job_name} not found in database")
                 context.job.schedule_removal()
+                _forget_jobs(user_id, job_name)
                 return
 
-            service_type = service_type_result[0]
+            job_data['service_type'] = service_type
+            job_data.update(_classify_job(service_type, job_name))
+        appointment_option = job_data['appointment_option']
 
         # Get preferred date for this job if it exists
         preferred_date = await get_preferred_date(user_id, job_name)
 
         # If we don't have a preferred date, check if we need to ask the user
         if not preferred_date and 'preferred_date_asked' not in job_data:
-            # Determine form type based on service type
-            form_option = None
-            if service_type == "menores":
-                if "1 HIJO" in job_name:
-                    form_option = "first"
-                elif "2 HIJOS" in job_name:
-                    form_option = "second"
-                elif "3 HIJOS" in job_name:
-                    form_option = "third"
-            else:
-                form_option = "certificate"
-
+            form_option = job_data['form_option']
             if form_option:
-                form_url = f"{GITHUB_PAGES_URL}/{form_option}_option.html?chat_id={chat_id}&job_name={job_name}&prefill=true"
+                query_string = urlencode({'chat_id': chat_id, 'job_name': job_name, 'prefill': 'true'})
+                form_url = f"{GITHUB_PAGES_URL}/{form_option}_option.html?{query_string}"
                 keyboard = [[InlineKeyboardButton("Set Preferred Date", url=form_url)]]
                 reply_markup = InlineKeyboardMarkup(keyboard)
 
@@ -558,61 +708,52 @@ async def check_dates_continuously(context: CallbackContext):
                 # Mark that we've asked so we don't keep asking
                 job_data['preferred_date_asked'] = True
 
-        # Determine the correct service option based on service type
-        if service_type == "menores":
-            # For menores services
-            option_part = job_name.split(", ")[-1]  # Extract "1 HIJO", "2 HIJOS", etc.
-            appointment_option = f"INSCRIPCIÓN MENORES LEY36 OPCIÓN {option_part}"
-        else:
-            # For certificate services
-            if "para DNI" in job_name:
-                appointment_option = "Solicitar certificación de Nacimiento para DNI"
-            else:
-                appointment_option = "Solicitar certificación de Nacimiento"
-
         logger.info(f"Checking appointments for {appointment_option}")
 
-        # Time-boxed appointment checking
+        # One appointment check per job at a time; a tick that finds the
+        # previous check still running skips instead of queueing behind it
+        job_lock = _JOB_LOCKS.setdefault((user_id, job_name), asyncio.Semaphore(1))
+        if job_lock.locked():
+            logger.info(f"Previous appointment check for {job_name} still running, skipping")
+            return
+
+        # Time-boxed appointment checking, finishing well inside the 60s interval
         try:
-            available_dates = await asyncio.wait_for(
-                check_appointments_async(appointment_option, preferred_date),
-                timeout=60  # 1-minute timeout
-            )
+            async with job_lock:
+                available_dates = await asyncio.wait_for(
+                    check_appointments_async(appointment_option, preferred_date),
+                    timeout=CHECK_TIMEOUT
+                )
         except asyncio.TimeoutError:
             logger.warning(f"Appointment check timed out for {job_name}")
             return
 
         if available_dates and len(available_dates) > 0:
             # Get the service type description for the notification
-            service_description = "unknown service"
-            if service_type == "menores":
-                service_description = "Reservar Cita de Menores Ley 36"
-            elif "para DNI" in job_name:
-                service_description = "Solicitar certificación de Nacimiento para DNI"
-            else:
-                service_description = "Solicitar certificación de Nacimiento"
-
-            # Send a simple notification first
-            await context.bot.send_message(
-                chat_id,
-                f"⚠️ Found appointments for {service_description}!"
-            )
-
-            # Check if a date was automatically selected
-            was_auto_selected = any("SELECTED" in date for date in available_dates)
-            was_closest = any("CLOSEST AVAILABLE" in date for date in available_dates)
+            service_description = job_data['service_description']
+
+            # Sort the dates in one pass: the automatically selected one, the
+            # closest to the preference, and the rest
+            selected_date = closest_date = None
+            other_dates = []
+            for date in available_dates:
+                if "SELECTED" in date:
+                    if selected_date is None:
+                        selected_date = date
+                elif "CLOSEST AVAILABLE" in date:
+                    if closest_date is None:
+                        closest_date = date
+                else:
+                    other_dates.append(date)
 
             # Format the detailed message
-            if was_auto_selected:
-                selected_date = next(date for date in available_dates if "SELECTED" in date)
+            if selected_date:
                 formatted_message = (
                     f"✅ APPOINTMENT BOOKED for {job_name}:\n\n"
                     f"• {selected_date}\n\n"
                     "Your appointment has been automatically booked based on your preference."
                 )
-            elif was_closest:
-                closest_date = next(date for date in available_dates if "CLOSEST AVAILABLE" in date)
-                other_dates = [d for d in available_dates if "CLOSEST AVAILABLE" not in d]
+            elif closest_date:
                 formatted_message = (
                     f"✅ CLOSEST DATE FOUND for {job_name}:\n\n"
                     f"• {closest_date}\n\n"
@@ -621,35 +762,36 @@ async def check_dates_continuously(context: CallbackContext):
                 if other_dates:
                     formatted_message += "\n\nOther available dates:\n• " + "\n• ".join(other_dates)
             else:
-                formatted_dates = "\n• ".join(available_dates)
+                formatted_dates = "\n• ".join(other_dates)
                 formatted_message = (
                     f"✅ AVAILABLE DATES FOUND for {job_name}:\n\n"
                     f"• {formatted_dates}\n\n"
                     "Please log in to the system as soon as possible to book your appointment."
                 )
 
-            # Send the detailed message
-            await context.bot.send_message(chat_id, formatted_message)
-            logger.info(f"Available dates found for user {chat_id}")
-
-            # Clean up after successful find
+            # Send the notification and the details as one message. The job
+            # is only finished once the user has it; if the send fails the
+            # job keeps running and the next check tries again
+            await context.bot.send_message(
+                chat_id,
+                f"⚠️ Found appointments for {service_description}!\n\n{formatted_message}"
+            )
             context.job.schedule_removal()
-            await remove_user_job(user_id, job_name)
+            logger.info(f"Available dates found for user {chat_id}")
 
-            # Return to main menu
-            fake_update = Update(
-                update_id=0,
-                message=Message(
-                    message_id=0,
-                    chat=Chat(id=chat_id, type='private'),
-                    date=None
+            async def send_main_menu():
+                # The finished job is deleted alongside, so leave it out
+                has_jobs = any(name != job_name for name in await get_user_jobs(user_id))
+                await context.bot.send_message(
+                    chat_id=chat_id,
+                    text="Please choose an option:",
+                    reply_markup=_KB_WITH_JOBS if has_jobs else _KB_NO_JOBS
                 )
-            )
-            await context.bot.send_message(
-                chat_id=chat_id,
-                text="Please choose an option:",
-                reply_markup=await show_options(fake_update, context)
-            )
+
+            # Return to main menu while the finished job is removed
+            await asyncio.gather(send_main_menu(), remove_user_job(user_id, job_name))
+            _invalidate_user_jobs(user_id)
+            _forget_jobs(user_id, job_name)
         else:
             logger.info(f"No available dates for user {chat_id}")
 
@@ -658,19 +800,12 @@ async def check_dates_continuously(context: CallbackContext):
         logger.error(f"Background job error for user {chat_id}: {e}")
         
         # Get service type for more specific user messaging
-        service_type = None
-        try:
-            with SessionLocal() as session:
-                service_type_result = session.execute(text("""
-                    SELECT service_type FROM user_jobs
-                    WHERE user_id = :user_id AND job_name = :job_name
-                    LIMIT 1
-                """), {"user_id": user_id, "job_name": job_name}).fetchone()
-                
-                if service_type_result:
-                    service_type = service_type_result[0]
-        except:
-            pass
+        service_type = job_data.get('service_type')
+        if service_type is None:
+            try:
+                service_type = await _get_service_type(user_id, job_name)
+            except Exception:
+                pass
             
         # Get additional context for error logging
         additional_info = {
@@ -689,14 +824,14 @@ async def handle_preferred_date(update: Update, context: CallbackContext):
     text = update.message.text.strip()
 
     # Check if this looks like a date in format DD/MM/YYYY
-    if not re.match(r'^\d{1,2}/\d{1,2}/\d{4}$', text):
+    if not _DATE_RE.match(text):
         await update.message.reply_text(
             "Please provide your preferred date in format DD/MM/YYYY (e.g., 15/04/2025)"
         )
         return
 
     # Get active jobs for this user
-    user_jobs = await get_user_jobs(user_id)
+    user_jobs = await _cached_user_jobs(context, user_id)
 
     if not user_jobs:
         await update.message.reply_text(
@@ -798,7 +933,8 @@ async def handle_set_date_job_selection(update: Update, context: CallbackContext
             form_option = "third"
 
         if form_option:
-            form_url = f"{GITHUB_PAGES_URL}/{form_option}_option.html?chat_id={user_id}&job_name={job_name}&prefill=true"
+            query_string = urlencode({'chat_id': user_id, 'job_name': job_name, 'prefill': 'true'})
+            form_url = f"{GITHUB_PAGES_URL}/{form_option}_option.html?{query_string}"
             keyboard = [[InlineKeyboardButton("Set Preferred Date", url=form_url)]]
             reply_markup = InlineKeyboardMarkup(keyboard)
 
@@ -808,6 +944,46 @@ async def handle_set_date_job_selection(update: Update, context: CallbackContext
             )
 
 
+async def _run_appointment_check(option_text):
+    """Run one check against the site and remember its result."""
+    available_dates = await asyncio.wait_for(
+        check_appointments_async(option_text, max_attempts=1),
+        timeout=15
+    )
+    _AVAILABILITY_CACHE[option_text] = (time.monotonic(), available_dates)
+    return available_dates
+
+
+def _on_availability_check_done(option_text, task):
+    """
+    Forget a finished shared check, and retrieve its exception so a failure
+    nobody is still waiting on is not logged as never retrieved.
+    """
+    if _AVAILABILITY_IN_FLIGHT.get(option_text) is task:
+        del _AVAILABILITY_IN_FLIGHT[option_text]
+    if not task.cancelled():
+        task.exception()
+
+
+async def _check_appointments_once(option_text):
+    """
+    Single-attempt, time-boxed check for a user-requested appointment check.
+    Reuses a result from the last _AVAILABILITY_CACHE_TTL seconds or joins a
+    check for the same option that is already running.
+    """
+    cached = _AVAILABILITY_CACHE.get(option_text)
+    if cached and time.monotonic() - cached[0] < _AVAILABILITY_CACHE_TTL:
+        return cached[1]
+
+    task = _AVAILABILITY_IN_FLIGHT.get(option_text)
+    if task is None:
+        task = asyncio.ensure_future(_run_appointment_check(option_text))
+        _AVAILABILITY_IN_FLIGHT[option_text] = task
+        task.add_done_callback(functools.partial(_on_availability_check_done, option_text))
+    # Shielded so one caller giving up does not cancel the check for the others
+    return await asyncio.shield(task)
+
+
 async def handle_check_appointments(update: Update, context: CallbackContext):
     """Handle the callback query for checking appointments."""
     query = update.callback_query
@@ -825,7 +1001,7 @@ async def handle_check_appointments(update: Update, context: CallbackContext):
     try:
         if callback_data == "check_all":
             # Check all appointments
-            user_jobs = await get_user_jobs(user_id)
+            user_jobs = await _cached_user_jobs(context, user_id)
             if not user_jobs:
                 await status_message.edit_text("No active searches to check.")
                 # Nothing to check, resume jobs and return
@@ -833,54 +1009,85 @@ async def handle_check_appointments(update: Update, context: CallbackContext):
                 return
 
             await status_message.edit_text(f"Checking {len(user_jobs)} appointments...")
-            
-            results = []
+
+            # Get every job's service type in one query
+            try:
+                async with get_async_session() as session:
+                    service_types = dict((await session.execute(
+                        _SERVICE_TYPES_FOR_JOBS_STMT, {"user_id": user_id, "job_names": list(user_jobs)}
+                    )).all())
+            except Exception as e:
+                service_types = {}
+                lookup_error = f"Error - {str(e)}"
+            else:
+                lookup_error = None
+
+            # Work out every job's site option first, then run the checks concurrently
+            results = {}
+            option_texts = {}
             for job in user_jobs:
+                if lookup_error:
+                    results[job] = f"⚠️ {job}: {lookup_error}"
+                elif job not in service_types:
+                    results[job] = f"❌ {job}: Job not found"
+                else:
+                    option_texts[job] = _classify_job(service_types[job], job)['appointment_option']
+
+            # Jobs for the same site option (e.g. two children on "1 HIJO")
+            # share one check
+            jobs_by_option = collections.defaultdict(list)
+            for job, option_text in option_texts.items():
+                jobs_by_option[option_text].append(job)
+
+            semaphore = asyncio.Semaphore(MANUAL_CHECK_CONCURRENCY)
+            total = len(option_texts)
+            done = 0
+
+            async def check_and_count(option_text):
+                nonlocal done
                 try:
-                    # Update status to show progress
-                    await status_message.edit_text(f"Checking appointment: {job}...")
-                    
-                    # Get the service type
-                    with SessionLocal() as session:
-                        service_type_result = session.execute(text("""
-                            SELECT service_type FROM user_jobs
-                            WHERE user_id = :user_id AND job_name = :job_name
-                            LIMIT 1
-                        """), {"user_id": user_id, "job_name": job}).fetchone()
-
-                        if not service_type_result:
-                            results.append(f"❌ {job}: Job not found")
-                            continue
-
-                        service_type = service_type_result[0]
-
-                    # Determine appointment option
-                    if service_type == "menores":
-                        original_option = job.split(", ")[-1]
-                        original_option_text = f"INSCRIPCIÓN MENORES LEY36 OPCIÓN {original_option}"
+                    async with semaphore:
+                        return await _check_appointments_once(option_text)
+                finally:
+                    done += len(jobs_by_option[option_text])
+
+            async def progress_updater():
+                # One edit every few seconds at most, and only when progress moved
+                reported = 0
+                while True:
+                    await asyncio.sleep(CHECK_PROGRESS_INTERVAL)
+                    if done != reported:
+                        reported = done
+                        try:
+                            await status_message.edit_text(f"Checked {done}/{total}...")
+                        except Exception as e:
+                            logger.debug(f"Progress update failed for user {user_id}: {e}")
+
+            progress_task = asyncio.create_task(progress_updater())
+            try:
+                outcomes = await asyncio.gather(
+                    *(check_and_count(option_text) for option_text in jobs_by_option),
+                    return_exceptions=True
+                )
+            finally:
+                # Wait for the updater to stop so an edit still in flight
+                # cannot land after the final results
+                progress_task.cancel()
+                try:
+                    await progress_task
+                except asyncio.CancelledError:
+                    pass
+            for jobs, outcome in zip(jobs_by_option.values(), outcomes):
+                for job in jobs:
+                    if isinstance(outcome, asyncio.TimeoutError):
+                        results[job] = f"⚠️ {job}: Check timed out"
+                    elif isinstance(outcome, Exception):
+                        results[job] = f"⚠️ {job}: Error - {str(outcome)}"
+                    elif outcome:
+                        results[job] = f"✅ {job}: {', '.join(outcome)}"
                     else:
-                        if "para DNI" in job:
-                            original_option_text = "Solicitar certificación de Nacimiento para DNI"
-                        else:
-                            original_option_text = "Solicitar certificación de Nacimiento"
-
-                    # Use a single attempt with timeout
-                    try:
-                        available_dates = await asyncio.wait_for(
-                            check_appointments_async(original_option_text, max_attempts=1), 
-                            timeout=15
-                        )
-                        
-                        if available_dates:
-                            results.append(f"✅ {job}: {', '.join(available_dates)}")
-                        else:
-                            results.append(f"❌ {job}: No available dates")
-                    except asyncio.TimeoutError:
-                        results.append(f"⚠️ {job}: Check timed out")
-                    except Exception as e:
-                        results.append(f"⚠️ {job}: Error - {str(e)}")
-                except Exception as e:
-                    results.append(f"⚠️ {job}: Error - {str(e)}")
+                        results[job] = f"❌ {job}: No available dates"
+            results = [results[job] for job in user_jobs]
 
             # Send final results
             await status_message.edit_text("Appointment check completed.\n\n" + "\n".join(results))
@@ -891,37 +1098,19 @@ async def handle_check_appointments(update: Update, context: CallbackContext):
 
             try:
                 # Get the service type
-                with SessionLocal() as session:
-                    service_type_result = session.execute(text("""
-                        SELECT service_type FROM user_jobs
-                        WHERE user_id = :user_id AND job_name = :job_name
-                        LIMIT 1
-                    """), {"user_id": user_id, "job_name": job_name}).fetchone()
-
-                    if not service_type_result:
-                        await status_message.edit_text(f"Job {job_name} not found.")
-                        # Job not found, resume other jobs and return
-                        await resume_user_searches(context, user_id, paused_jobs)
-                        return
-
-                    service_type = service_type_result[0]
+                service_type = await _get_service_type(user_id, job_name)
+                if service_type is None:
+                    await status_message.edit_text(f"Job {job_name} not found.")
+                    # Job not found, resume other jobs and return
+                    await resume_user_searches(context, user_id, paused_jobs)
+                    return
 
                 # Determine appointment option
-                if service_type == "menores":
-                    original_option = job_name.split(", ")[-1]
-                    original_option_text = f"INSCRIPCIÓN MENORES LEY36 OPCIÓN {original_option}"
-                else:
-                    if "para DNI" in job_name:
-                        original_option_text = "Solicitar certificación de Nacimiento para DNI"
-                    else:
-                        original_option_text = "Solicitar certificación de Nacimiento"
+                original_option_text = _classify_job(service_type, job_name)['appointment_option']
 
                 # Use a single attempt with timeout
                 try:
-                    available_dates = await asyncio.wait_for(
-                        check_appointments_async(original_option_text, max_attempts=1),
-                        timeout=15
-                    )
+                    available_dates = await _check_appointments_once(original_option_text)
                     
                     if available_dates:
                         await status_message.edit_text(f"✅ Available dates found for {job_name}:\n\n{', '.join(available_dates)}")
@@ -962,17 +1151,8 @@ async def handle_check_appointments(update: Update, context: CallbackContext):
         await resume_user_searches(context, user_id, paused_jobs)
         return
 
-    # Create a fake Update object with a valid Message and User
-    fake_message = Message(
-        message_id=0,
-        date=None,
-        chat=Chat(id=query.message.chat_id, type='private'),
-        from_user=query.from_user
-    )
-    fake_update = Update(update_id=0, message=fake_message)
-
     # Show options after checking the job(s)
-    await query.message.reply_text("Please choose an option:", reply_markup=await show_options(fake_update, context))
+    await query.message.reply_text("Please choose an option:", reply_markup=await _build_options_markup(user_id))
     
     # Resume jobs after check is complete
     await resume_user_searches(context, user_id, paused_jobs)
@@ -986,30 +1166,9 @@ async def restart_active_jobs(app: Application):
         user_id = job["user_id"]
         job_name = job["job_name"]
 
-        # Get the service type
-        with SessionLocal() as session:
-            service_type_result = session.execute(text("""
-                SELECT service_type FROM user_jobs
-                WHERE user_id = :user_id AND job_name = :job_name
-                LIMIT 1
-            """), {"user_id": user_id, "job_name": job_name}).fetchone()
-
-            if not service_type_result:
-                logger.warning(f"Could not find service type for job: {job_name}")
-                continue
-
-            service_type = service_type_result[0]
-
-        # Determine the correct service option based on service type
-        if service_type == "menores":
-            original_option = job_name.split(", ")[-1]
-            original_option_text = f"INSCRIPCIÓN MENORES LEY36 OPCIÓN {original_option}"
-        else:
-            # For certificate services
-            if "para DNI" in job_name:
-                original_option_text = "Solicitar certificación de Nacimiento para DNI"
-            else:
-                original_option_text = "Solicitar certificación de Nacimiento"
+        # The active-jobs query already returns the service type
+        service_type = job["service_type"]
+        job_options = _classify_job(service_type, job_name)
 
         logger.info(f"Restarting job for user {user_id} with choice {job_name}")
 
@@ -1018,83 +1177,108 @@ async def restart_active_jobs(app: Application):
             check_dates_continuously,
             interval=60,
             first=5,
-            data={'chat_id': user_id, 'user_choice': original_option_text, 'user_id': user_id, 'job_name': job_name},
+            data={'chat_id': user_id, 'user_choice': job_options['appointment_option'],
+                  'user_id': user_id, 'job_name': job_name, 'service_type': service_type,
+                  **job_options},
+            name=job_name_to_run,
+            job_kwargs={'max_instances': 1}
+        )
+
+
+async def _schedule_search_job(job_queue, user_id, job_name, service_type=None):
+    """
+    Start the repeating date check for an active job unless it is already
+    scheduled. The service type is looked up if the caller does not have it.
+    """
+    job_name_to_run = f"check_dates_{user_id}_{job_name}"
+
+    # Quick check to prevent duplicate job launches
+    existing_jobs = job_queue.get_jobs_by_name(job_name_to_run)
+    if existing_jobs:
+        return
+
+    # Get the service type
+    if service_type is None:
+        try:
+            service_type = await _get_service_type(user_id, job_name)
+            if service_type is None:
+                logger.warning(f"Could not find service type for job: {job_name}")
+                return
+        except Exception as db_error:
+            logger.error(f"Database error when getting service type: {db_error}")
+            logger.error(traceback.format_exc())
+            return
+
+    # Form page, site option and description, worked out once per job
+    job_options = _classify_job(service_type, job_name)
+
+    # Efficient job scheduling
+    try:
+        job_queue.run_repeating(
+            check_dates_continuously,
+            interval=60,
+            first=5,
+            data={
+                'chat_id': user_id,
+                'user_choice': job_options['appointment_option'],
+                'user_id': user_id,
+                'job_name': job_name,
+                'service_type': service_type,
+                **job_options
+            },
             name=job_name_to_run,
-            job_kwargs={'max_instances': 2}
+            job_kwargs={'max_instances': 1}  # Prevent multiple instances
         )
+        logger.info(f"Scheduled job for {job_name}")
+    except Exception as job_error:
+        logger.error(f"Error scheduling job {job_name}: {job_error}")
+        logger.error(traceback.format_exc())
 
 
 async def check_for_new_jobs(context: CallbackContext):
-    """Efficient periodic check for new active jobs."""
+    """Periodic fallback check for active jobs missed by the form_ready listener."""
     try:
         active_jobs = await get_all_active_jobs()
         logger.info(f"Checking {len(active_jobs)} potentially new jobs")
 
-        # Batch processing to reduce individual job overhead
         for job in active_jobs:
-            user_id = job["user_id"]
-            job_name = job["job_name"]
-            job_name_to_run = f"check_dates_{user_id}_{job_name}"
+            await _schedule_search_job(context.job_queue, job["user_id"], job["job_name"], job["service_type"])
 
-            # Quick check to prevent duplicate job launches
-            existing_jobs = context.job_queue.get_jobs_by_name(job_name_to_run)
-            if existing_jobs:
-                continue
+    except Exception as e:
+        logger.error(f"Error in job checking process: {e}")
+        logger.error(f"Traceback: {traceback.format_exc()}")
 
-            # Get the service type
-            try:
-                with SessionLocal() as session:
-                    # Use sqlalchemy.text explicitly to avoid conflict
-                    result = session.execute(text("""
-                        SELECT service_type FROM user_jobs
-                        WHERE user_id = :user_id AND job_name = :job_name
-                        LIMIT 1
-                    """), {"user_id": user_id, "job_name": job_name}).fetchone()
-
-                    if not result:
-                        logger.warning(f"Could not find service type for job: {job_name}")
-                        continue
-
-                    service_type = result[0]
-            except Exception as db_error:
-                logger.error(f"Database error when getting service type: {db_error}")
-                logger.error(traceback.format_exc())
-                continue
-
-            # Determine the correct service option based on service type
-            if service_type == "menores":
-                option_part = job_name.split(", ")[-1]
-                original_option = f"INSCRIPCIÓN MENORES LEY36 OPCIÓN {option_part}"
-            else:
-                # For certificate services
-                if "para DNI" in job_name:
-                    original_option = "Solicitar certificación de Nacimiento para DNI"
-                else:
-                    original_option = "Solicitar certificación de Nacimiento"
 
-            # Efficient job scheduling
-            try:
-                context.job_queue.run_repeating(
-                    check_dates_continuously,
-                    interval=60,
-                    first=5,
-                    data={
-                        'chat_id': user_id,
-                        'user_choice': original_option,
-                        'user_id': user_id,
-                        'job_name': job_name
-                    },
-                    name=job_name_to_run,
-                    job_kwargs={'max_instances': 1}  # Prevent multiple instances
-                )
-                logger.info(f"Scheduled job for {job_name}")
-            except Exception as job_error:
-                logger.error(f"Error scheduling job {job_name}: {job_error}")
-                logger.error(traceback.format_exc())
+async def keep_form_listener(context: CallbackContext):
+    """
+    Re-establish the form_ready LISTEN when its connection is gone, and sweep
+    for jobs activated while nothing was listening.
+    """
+    conn = context.bot_data.get('form_ready_conn')
+    if conn is not None:
+        if await is_listening(conn):
+            return
+        context.bot_data['form_ready_conn'] = None
+        try:
+            await conn.invalidate()
+        except Exception:
+            pass
 
+    try:
+        context.bot_data['form_ready_conn'] = await listen_for_ready_forms(
+            functools.partial(_on_form_ready, context.job_queue)
+        )
     except Exception as e:
-        logger.error(f"Error in job checking process: {e}")
-        logger.error(f"Traceback: {traceback.format_exc()}")
+        logger.error(f"Could not listen for ready forms, retrying in {FORM_LISTENER_CHECK_INTERVAL}s: {e}")
+    await check_for_new_jobs(context)
+
+
+def _on_form_ready(job_queue, user_id, job_name):
+    """Schedule the search for a job as soon as its form submission is committed."""
+    logger.info(f"Form ready notification for user {user_id}, job {job_name}")
+    task = asyncio.create_task(_schedule_search_job(job_queue, user_id, job_name))
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
 
 
 async def pause_user_searches(context, user_id):
@@ -1153,6 +1337,9 @@ async def on_startup(app: Application):
         logger.info("Database initialized successfully.")
     except Exception as e:
         logger.error(f"Database initialization error: {str(e)}")
+    finally:
+        # Handlers run against the database as it is from here on
+        _DB_READY.set()
 
     try:
         await restart_active_jobs(app)
@@ -1160,19 +1347,38 @@ async def on_startup(app: Application):
     except Exception as e:
         logger.error(f"Error restarting active jobs: {str(e)}")
 
+    # Newly activated jobs are pushed by the database; keep a slow periodic
+    # sweep as a fallback for notifications missed while disconnected
+    try:
+        app.bot_data['form_ready_conn'] = await listen_for_ready_forms(
+            functools.partial(_on_form_ready, app.job_queue)
+        )
+    except Exception as e:
+        logger.error(f"Could not listen for ready forms, relying on periodic checks: {str(e)}")
+
+    # Reconnect the listener if it drops; until it is back, sweep every minute
+    app.job_queue.run_repeating(
+        keep_form_listener,
+        interval=FORM_LISTENER_CHECK_INTERVAL,
+        first=FORM_LISTENER_CHECK_INTERVAL,
+        name="keep_form_listener",
+        job_kwargs={'max_instances': 1}
+    )
+
     # Add a job to check for new active jobs periodically
     app.job_queue.run_repeating(
         check_for_new_jobs,
-        interval=60,  # Check every 30 seconds
+        interval=NEW_JOBS_CHECK_INTERVAL,
         first=5,  # Start checking after 5 seconds
         name="check_for_new_jobs",
         job_kwargs={'max_instances': 2}
     )
     logger.info("Added job checker to periodically check for new active jobs")
 
-    # Store reference to the telegram app globally
-    global telegram_app
+    # Store reference to the telegram app and its event loop globally
+    global telegram_app, bot_loop
     telegram_app = app
+    bot_loop = asyncio.get_running_loop()
     logger.info("Telegram app global variable set.")
 
 
@@ -1191,7 +1397,7 @@ def main():
 
         # Add handlers
         app.add_handler(CommandHandler("start", start))
-        app.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND & filters.Regex(r'^\d{1,2}/\d{1,2}/\d{4}$'),
+        app.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND & filters.Regex(_DATE_RE),
                                        handle_preferred_date))
         app.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, handle_option))
         app.add_handler(CallbackQueryHandler(handle_cancel_job, pattern="^cancel_"))
@@ -11,10 +11,6 @@ from datetime import datetime
 from typing import List, Optional, Dict
 from playwright.async_api import async_playwright, TimeoutError
 
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-)
 logger = logging.getLogger(__name__)
 
 MENORES_URL = "https://www.exteriores.gob.es/Consulados/lahabana/es/ServiciosConsulares/Paginas/menorescita.aspx"